@@ -16,19 +16,48 @@ from typing import Optional, Generator
 
 log = logging.getLogger("database")
 
+# queue and executions are written only by app.storage with fixed types, so new
+# databases create them STRICT (SQLite 3.37+) and a wrong-typed write fails loudly.
+# STRICT only accepts the five storage types, hence TEXT for the timestamps there.
+# Existing tables are left as they are: rebuilding a live queue is not worth it.
+_STRICT_OK = sqlite3.sqlite_version_info >= (3, 37, 0)
+_STRICT = " STRICT" if _STRICT_OK else ""
+_TIMESTAMP_TYPE = "TEXT" if _STRICT_OK else "DATETIME"
+
+# legs_index columns added after the table first shipped, as (name, declaration).
+# leg_idx is left to refindex, which backfills it when it adds the column.
+_LEGS_INDEX_ADDED_COLUMNS = (
+    ("order_ticket", "INTEGER"),
+    ("position_ticket", "INTEGER"),
+    ("filled_price", "REAL"),
+    ("filled_at", "DATETIME"),
+    ("is_filled", "INTEGER DEFAULT 0"),
+    ("entry_price", "REAL"),
+    ("current_sl", "REAL"),
+    ("current_tp", "REAL"),
+    ("is_risk_free", "INTEGER DEFAULT 0"),
+)
+
 class DatabaseManager:
     """
     Thread-safe SQLite connection manager.
     Handles connection pooling, proper locking, and ensures database integrity.
     """
     
-    def __init__(self, db_path: str, max_connections: int = 10):
+    def __init__(self, db_path: str, max_connections: int = 10, max_readers: int = 4):
         self.db_path = str(Path(db_path).resolve())
         self.max_connections = max_connections
+        self.max_readers = max_readers
         self._lock = threading.RLock()
         self._connections = []
         self._in_use = set()
         self._initialized = False
+        # Dedicated connection for maintenance writes, outside the shared pool
+        self._write_conn: Optional[sqlite3.Connection] = None
+        self._write_lock = threading.Lock()
+        # Idle query_only connections for read-only lookups, outside the shared pool
+        self._read_idle: list[sqlite3.Connection] = []
+        self._read_lock = threading.Lock()
         
         # Ensure directory exists
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
@@ -39,7 +68,8 @@ class DatabaseManager:
             self.db_path, 
             timeout=30.0,
             isolation_level=None,  # autocommit mode
-            check_same_thread=False  # We handle thread safety ourselves
+            check_same_thread=False,  # We handle thread safety ourselves
+            cached_statements=256  # every storage/refindex statement stays prepared per connection
         )
         
         # Configure for reliability and performance
@@ -47,6 +77,10 @@ class DatabaseManager:
         conn.execute("PRAGMA synchronous=NORMAL") 
         conn.execute("PRAGMA foreign_keys=ON")
         conn.execute("PRAGMA busy_timeout=30000")  # 30 second timeout
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-16384")  # 16 MiB page cache per pooled connection
+        conn.execute("PRAGMA mmap_size=268435456")  # read pages via a 256 MiB shared mapping
+        conn.execute("PRAGMA wal_autocheckpoint=1000")
         
         return conn
         
@@ -105,6 +139,47 @@ class DatabaseManager:
         finally:
             self._return_connection(conn)
             
+    @contextmanager
+    def get_write_connection(self) -> Generator[sqlite3.Connection, None, None]:
+        """
+        Context manager for the dedicated maintenance-write connection.
+        
+        Bulk/maintenance writers (queue reset, cleanup) use this instead of the pool,
+        so they never wait for a pooled connection and pooled readers never wait for
+        them; WAL lets those readers keep going while it writes. One writer at a time.
+        """
+        with self._write_lock:
+            if self._write_conn is None:
+                conn = self._create_connection()
+                conn.execute("PRAGMA busy_timeout=5000")
+                self._write_conn = conn
+            yield self._write_conn
+
+    @contextmanager
+    def get_read_connection(self) -> Generator[sqlite3.Connection, None, None]:
+        """
+        Context manager for a read-only (query_only) connection.
+        
+        Lookups and monitoring reads use these so they never take a pooled
+        connection from a writer; under WAL each read runs on its own snapshot
+        without blocking or being blocked by the writer. Up to max_readers idle
+        connections are kept; a burst beyond that opens (and then closes) extras.
+        """
+        with self._read_lock:
+            conn = self._read_idle.pop() if self._read_idle else None
+        if conn is None:
+            conn = self._create_connection()
+            conn.execute("PRAGMA query_only=ON")
+        try:
+            yield conn
+        finally:
+            with self._read_lock:
+                if len(self._read_idle) < self.max_readers:
+                    self._read_idle.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+
     def execute_one(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
         """Execute a single SQL statement and return the cursor."""
         with self.get_connection() as conn:
@@ -127,6 +202,16 @@ class DatabaseManager:
             cursor = conn.execute(sql, params)
             return cursor.fetchall()
             
+    def fetchone_ro(self, sql: str, params: tuple = ()) -> Optional[tuple]:
+        """Execute a read-only query and fetch one row."""
+        with self.get_read_connection() as conn:
+            return conn.execute(sql, params).fetchone()
+            
+    def fetchall_ro(self, sql: str, params: tuple = ()) -> list[tuple]:
+        """Execute a read-only query and fetch all rows."""
+        with self.get_read_connection() as conn:
+            return conn.execute(sql, params).fetchall()
+            
     def initialize_schema(self) -> None:
         """Initialize database schema. Safe to call multiple times."""
         with self._lock:
@@ -135,15 +220,15 @@ class DatabaseManager:
                 
             with self.get_connection() as conn:
                 # Create all tables
-                conn.executescript("""
+                conn.executescript(f"""
                     -- Queue table for pending actions
                     CREATE TABLE IF NOT EXISTS queue(
                         action_id TEXT PRIMARY KEY,
                         payload   BLOB NOT NULL,
                         status    TEXT NOT NULL DEFAULT 'PENDING',
                         ts        REAL NOT NULL,
-                        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-                    );
+                        created_at {_TIMESTAMP_TYPE} DEFAULT CURRENT_TIMESTAMP
+                    ){_STRICT};
                     
                     -- Execution results
                     CREATE TABLE IF NOT EXISTS executions(
@@ -151,8 +236,8 @@ class DatabaseManager:
                         status        TEXT NOT NULL,
                         router_result BLOB,
                         ts            REAL NOT NULL,
-                        created_at    DATETIME DEFAULT CURRENT_TIMESTAMP
-                    );
+                        created_at    {_TIMESTAMP_TYPE} DEFAULT CURRENT_TIMESTAMP
+                    ){_STRICT};
                     
                     -- Signal tracking  
                     CREATE TABLE IF NOT EXISTS signals(
@@ -167,6 +252,7 @@ class DatabaseManager:
                     CREATE TABLE IF NOT EXISTS legs_index(
                         group_key         TEXT,
                         leg_tag           TEXT,
+                        leg_idx           INTEGER,
                         symbol            TEXT,
                         volume            REAL,
                         entry             REAL,
@@ -177,15 +263,39 @@ class DatabaseManager:
                         order_ticket      INTEGER,
                         position_ticket   INTEGER,
                         created_at        DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        -- Fill tracking (position poller / risk-free management)
+                        filled_price      REAL,
+                        filled_at         DATETIME,
+                        is_filled         INTEGER DEFAULT 0,
+                        entry_price       REAL,
+                        current_sl        REAL,
+                        current_tp        REAL,
+                        is_risk_free      INTEGER DEFAULT 0,
                         UNIQUE(group_key, leg_tag)
                     );
-                    
+                """)
+                
+                # Databases created before a column existed get it added here, so the
+                # indexes below (and the queries using them) can rely on it
+                existing = {row[1] for row in conn.execute("PRAGMA table_info(legs_index)")}
+                for name, decl in _LEGS_INDEX_ADDED_COLUMNS:
+                    if name not in existing:
+                        conn.execute(f"ALTER TABLE legs_index ADD COLUMN {name} {decl}")
+                
+                conn.executescript("""
                     -- Indexes for performance
                     CREATE INDEX IF NOT EXISTS idx_queue_status_ts ON queue(status, ts);
                     CREATE INDEX IF NOT EXISTS idx_executions_ts ON executions(ts);
                     CREATE INDEX IF NOT EXISTS idx_signals_group_key ON signals(group_key);
-                    CREATE INDEX IF NOT EXISTS idx_legs_group_key ON legs_index(group_key);
+                    -- UNIQUE(group_key, leg_tag) already indexes group_key lookups (and
+                    -- exact leg updates); a separate group_key index only slows writes
+                    DROP INDEX IF EXISTS idx_legs_group_key;
                     CREATE INDEX IF NOT EXISTS idx_legs_tickets ON legs_index(order_ticket, position_ticket);
+                    CREATE INDEX IF NOT EXISTS idx_legs_filled ON legs_index(group_key, is_filled);
+                    -- Few legs ever go risk-free; a partial index replaces the full
+                    -- (group_key, is_risk_free) one and keeps the lookup tiny
+                    DROP INDEX IF EXISTS idx_legs_risk_free;
+                    CREATE INDEX IF NOT EXISTS idx_legs_group_risk_free ON legs_index(group_key) WHERE is_risk_free = 1;
                 """)
                 
             self._initialized = True
@@ -195,12 +305,32 @@ class DatabaseManager:
         """Close all connections. Call this on shutdown."""
         with self._lock:
             for conn in self._connections:
+                try:
+                    # Refresh planner stats for indexes this connection actually used (bounded work)
+                    conn.execute("PRAGMA analysis_limit=400")
+                    conn.execute("PRAGMA optimize")
+                except sqlite3.Error:
+                    pass
                 try:
                     conn.close()
                 except:
                     pass
             self._connections.clear()
             self._in_use.clear()
+        with self._read_lock:
+            for conn in self._read_idle:
+                try:
+                    conn.close()
+                except:
+                    pass
+            self._read_idle.clear()
+        with self._write_lock:
+            if self._write_conn is not None:
+                try:
+                    self._write_conn.close()
+                except:
+                    pass
+                self._write_conn = None
             
     def get_stats(self) -> dict:
         """Get connection pool statistics for monitoring."""
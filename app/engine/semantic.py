@@ -1,4 +1,5 @@
 from __future__ import annotations
+import functools
 import os
 from typing import Any, Dict, List, Optional
 import yaml
@@ -29,6 +30,18 @@ def load_semantic_dictionary(path: str) -> SemanticDictionary:
     except Exception:
         return SemanticDictionary({})
 
+@functools.lru_cache(maxsize=8)
+def _load_semantic_dictionary_at(path: str, mtime_ns: Optional[int]) -> SemanticDictionary:
+    return load_semantic_dictionary(path)
+
+def load_semantic_dictionary_cached(path: str) -> SemanticDictionary:
+    """Load the semantic YAML, re-parsing only when (path, mtime) changed."""
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        mtime_ns = None
+    return _load_semantic_dictionary_at(path, mtime_ns)
+
 # --- simple dotted path getter ---
 def _get_path(obj: Any, path: str) -> Any:
     if path is None or path == "":
@@ -6,9 +6,12 @@ import traceback
 import logging
 import os
 import time
-from typing import Any, Dict, List, Optional
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+import sqlite3
 
 from app import storage
+from app.common.database import get_db_manager
 from app.infra.mt5_router import get_router
 from app.models import Action, RouterResult
 
@@ -240,6 +243,18 @@ class SpinnerUI:
 
 
 # -------- Refindex helpers ----------------------------------------------------
+@contextmanager
+def _refindex_conn() -> Iterator[sqlite3.Connection]:
+    """Pooled connection for refindex hooks that take a connection and commit it themselves."""
+    with get_db_manager().get_connection() as conn:
+        conn.execute("BEGIN")
+        try:
+            yield conn
+        finally:
+            # Hook returned early or raised without committing: don't hand back an open transaction
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+
 def _ensure_ticket_columns_once():
     if not refindex:
         return
@@ -250,16 +265,12 @@ def _ensure_ticket_columns_once():
         func()
         log.info("REFINDEX: ensured ticket columns (no-arg)")
     except TypeError:
-        get_conn = getattr(refindex, "get_connection", None)
-        if callable(get_conn):
-            try:
-                conn = get_conn()
+        try:
+            with _refindex_conn() as conn:
                 func(conn)  # type: ignore[misc]
-                log.info("REFINDEX: ensured ticket columns (with-conn)")
-            except Exception as e:
-                log.warning("REFINDEX: ensure_ticket_columns failed with-conn: %s", e, extra={"event": "REFINDEX_INIT_WARN"})
-        else:
-            log.warning("REFINDEX: ensure_ticket_columns requires a connection but get_connection() not found", extra={"event": "REFINDEX_INIT_WARN"})
+            log.info("REFINDEX: ensured ticket columns (with-conn)")
+        except Exception as e:
+            log.warning("REFINDEX: ensure_ticket_columns failed with-conn: %s", e, extra={"event": "REFINDEX_INIT_WARN"})
     except Exception as e:
         log.warning("REFINDEX: ensure_ticket_columns error: %s", e, extra={"event": "REFINDEX_INIT_WARN"})
 
@@ -282,17 +293,13 @@ def _apply_open_result_safe(action: Action, result: RouterResult):
         log.info("REFINDEX: applied open result (no-conn)", extra={"event": "OPEN_TICKETS_SAVED", "action_id": action.action_id})
         return
     except TypeError:
-        get_conn = getattr(refindex, "get_connection", None)
-        if callable(get_conn):
-            try:
-                conn = get_conn()
+        try:
+            with _refindex_conn() as conn:
                 func(conn, action, result)  # type: ignore[misc]
-                log.info("REFINDEX: applied open result (with-conn)", extra={"event": "OPEN_TICKETS_SAVED", "action_id": action.action_id})
-                return
-            except Exception as e:
-                log.error("REFINDEX: apply_open_result failed with-conn: %s", e, extra={"event": "OPEN_TICKETS_SAVE_ERROR", "action_id": action.action_id})
-        else:
-            log.warning("REFINDEX: apply_open_result requires a connection but get_connection() not found", extra={"event": "OPEN_TICKETS_SAVE_WARN", "action_id": action.action_id})
+            log.info("REFINDEX: applied open result (with-conn)", extra={"event": "OPEN_TICKETS_SAVED", "action_id": action.action_id})
+            return
+        except Exception as e:
+            log.error("REFINDEX: apply_open_result failed with-conn: %s", e, extra={"event": "OPEN_TICKETS_SAVE_ERROR", "action_id": action.action_id})
     except Exception as e:
         log.error("REFINDEX: apply_open_result failed: %s", e, extra={"event": "OPEN_TICKETS_SAVE_ERROR", "action_id": action.action_id})
 
@@ -324,16 +331,32 @@ def _resolve_poll_seconds(poll_seconds_arg: Optional[float]) -> float:
 from collections import Counter
 
 def process_once(router, batch: int = 32) -> int:
-    actions: List[Action] = storage.fetch_batch(limit=batch)
+    # Claiming moves the batch to IN_PROGRESS up front, in one statement
+    actions: List[Action] = storage.claim_batch(limit=batch)
+    # Already-executed actions only need closing out; they are committed together below.
+    # Executed actions are still marked done one by one, right after the router returns,
+    # so a crash can never leave a sent trade without its execution record.
+    deduped: List[tuple] = []
+    started: List[str] = []
+    try:
+        return _process_claimed(router, actions, deduped, started)
+    finally:
+        # Something raised mid-batch: the action that was running stays IN_PROGRESS
+        # (it may have reached MT5), the ones never started go back to PENDING
+        storage.release_claimed([a.action_id for a in actions[len(started):]])
+        storage.mark_done_many(deduped)
+
+
+def _process_claimed(router, actions: List[Action], deduped: List[tuple], started: List[str]) -> int:
     processed = 0
     for action in actions:
+        started.append(action.action_id)
         prior = storage.already_executed(action.action_id)
         if prior:
-            storage.mark_done(action.action_id, prior)
+            deduped.append((action.action_id, prior))
             log.info("DEDUP", extra={"event": "DEDUP", "action_id": action.action_id, "status": prior.status})
             continue
 
-        storage.mark_in_progress(action.action_id)
         result: RouterResult = router.execute(action)
         storage.mark_done(action.action_id, result)
 
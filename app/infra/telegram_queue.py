@@ -13,9 +13,9 @@ from dotenv import load_dotenv
 from telethon import TelegramClient, events
 from telethon.errors import SessionPasswordNeededError
 
-from app.engine.semantic import load_semantic_dictionary
-from app.storage import init_db, enqueue
+from app.storage import init_db, enqueue_many
 from app.processing import build_actions_from_message
+from app.engine.semantic import load_semantic_dictionary_cached
 from app.common.logging_setup import setup_logging
 from app.infra.unparsed_reporter import UnparsedReporter
 
@@ -317,7 +317,7 @@ def _echo_runtime_config():
     dict_ver = "NA"
     dict_path = SEMANTIC_DICT_PATH
     try:
-        sem_dict = load_semantic_dictionary(dict_path)
+        sem_dict = load_semantic_dictionary_cached(dict_path)
         dict_ver = getattr(sem_dict, "version", None) or getattr(sem_dict, "dictionary_version", None) or "-"
         console.safe_log(log, "info",
             "SEMANTIC_DICT_LOADED",
@@ -491,14 +491,15 @@ async def run_telegram_ingest():
             )
 
             if actions:
+                # One transaction for the whole message; dedup is reported per action
+                added = enqueue_many(actions)
                 for a in actions:
-                    dedup = not enqueue(a)
                     console.safe_log(log, "info",
                         "INGESTED_NEW",
                         extra={
                             "event": "INGESTED_DONE",
                             "action_id": a.action_id,
-                            "dedup": dedup,
+                            "dedup": a.action_id not in added,
                             "chat_id": getattr(chat, "id", None),
                             "chat_title": getattr(chat, "title", None) or getattr(chat, "username", None),
                         }
@@ -544,14 +545,15 @@ async def run_telegram_ingest():
             )
 
             if actions:
+                # One transaction for the whole message; dedup is reported per action
+                added = enqueue_many(actions)
                 for a in actions:
-                    dedup = not enqueue(a)
                     console.safe_log(log, "info",
                         "INGESTED_EDIT",
                         extra={
                             "event": "INGESTED_EDIT",
                             "action_id": a.action_id,
-                            "dedup": dedup,
+                            "dedup": a.action_id not in added,
                             "chat_id": getattr(chat, "id", None),
                             "chat_title": getattr(chat, "title", None) or getattr(chat, "username", None),
                         }
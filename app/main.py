@@ -1,11 +1,12 @@
 # app/main.py - Updated with centralized initialization
-import os, sqlite3, json
+import os, json
 from collections import Counter
 import typer
 
 # New centralized initialization
 from app.common.app_init import initialize_cli_tool
-from app.storage import enqueue
+from app.storage import enqueue_many, decode_payload
+from app.common.database import get_db_manager
 from app.infra.actions_runner import run_forever, process_once
 from app.models import Action, Leg
 from app.processing import build_actions_from_message
@@ -52,7 +53,7 @@ def smoke(symbol: str = "XAUUSD", side: str = "SELL", volume: float = 0.01,
     leg = Leg(leg_id="SMOKE#1", symbol=symbol, side=side.upper(), volume=volume, tag="SMOKE")
     open_action = Action(action_id="smoke-open", type="OPEN", legs=[leg], source_msg_id="SMOKE")
     close_action = Action(action_id="smoke-close", type="CLOSE", legs=[leg], source_msg_id="SMOKE")
-    enqueue(open_action); enqueue(close_action)
+    enqueue_many([open_action, close_action])
     typer.echo("Smoke actions enqueued.")
 
 @app.command()
@@ -63,18 +64,15 @@ def status(n: int = 10,
     """Show queue/execution counts, leg totals, and last N actions."""
     config = initialize_cli_tool(log_level)  # Replaces setup_logging + init_db
     
-    # Use the config object instead of direct environment access
-    db_path = config.APP_DB_PATH
-    con = sqlite3.connect(db_path)
-
-    counts = dict(con.execute("SELECT status, COUNT(*) FROM queue GROUP BY status").fetchall())
-    ex_count = con.execute("SELECT COUNT(*) FROM executions").fetchone()[0]
-    rows = con.execute("SELECT payload FROM queue ORDER BY ts DESC").fetchall()
+    db_manager = get_db_manager()
+    counts = dict(db_manager.fetchall("SELECT status, COUNT(*) FROM queue GROUP BY status"))
+    ex_count = db_manager.fetchone("SELECT COUNT(*) FROM executions")[0]
+    rows = db_manager.fetchall("SELECT payload FROM queue ORDER BY ts DESC")
 
     types = Counter()
     total_legs = 0
     for (p,) in rows:
-        d = json.loads(p.decode())
+        d = json.loads(decode_payload(p))
         types[d["type"]] += 1
         total_legs += len(d["legs"])
 
@@ -85,7 +83,7 @@ def status(n: int = 10,
 
     print("\nlast actions:")
     for (p,) in rows[:n]:
-        d = json.loads(p.decode())
+        d = json.loads(decode_payload(p))
         print(f"{d['type']}\tlegs={len(d['legs'])}\tid={d['action_id']}")
 
     if show_files:
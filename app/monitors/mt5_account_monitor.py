@@ -9,6 +9,7 @@ import time
 import queue
 import threading
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from typing import Dict, List, Optional, Tuple, Any
 
@@ -18,7 +19,7 @@ from app.common.config import Config
 from app.common.logging_config import setup_logging
 from app.infra.mt5_router import Mt5NativeRouter
 from .actions import Action, execute_actions, Alert
-from .user_monitors import MONITORS
+from .user_monitors import MONITORS, warm_symbol_cache
 
 app = typer.Typer(no_args_is_help=True)
 log = logging.getLogger("mt5_account_monitor")
@@ -164,6 +165,8 @@ def _summarise_positions(mt5, symbols_filter: Optional[List[str]]) -> List[dict]
             side = "BUY" if getattr(p, "type", 0) == mt5.POSITION_TYPE_BUY else "SELL"
             comment = getattr(p, "comment", "") or ""
             msg_id, leg, sym_suffix = _parse_msg_leg_from_comment(comment)
+            # Types are normalised here once (ticket int, prices float, sl/tp float|None,
+            # leg int|None); user monitors read these fields without re-coercing.
             out.append({
                 "kind": "position",
                 "ticket": int(getattr(p, "ticket", 0)),
@@ -208,6 +211,7 @@ def _summarise_orders(mt5, symbols_filter: Optional[List[str]]) -> List[dict]:
             }.get(t, str(t))
             comment = getattr(o, "comment", "") or ""
             msg_id, leg, sym_suffix = _parse_msg_leg_from_comment(comment)
+            # Same normalised field types as _summarise_positions.
             out.append({
                 "kind": "order",
                 "ticket": int(getattr(o, "ticket", 0)),
@@ -492,6 +496,25 @@ def _write_outputs(base_dir: str, positions: List[dict], orders: List[dict], agg
             for r in orders:
                 w.writerow(r)
 
+def _evaluate_monitors(pool: Optional[ThreadPoolExecutor], positions: List[dict], orders: List[dict],
+                       ctx: Dict[str, Any]) -> List[Action]:
+    """
+    Run every user monitor on the same snapshot and concatenate their actions in MONITORS
+    order. Monitors share no mutable state except the per-tick ctx["ticks"] cache, so with
+    a pool their MT5/SQLite waits overlap; a failing monitor becomes a [monitor_error] alert.
+    """
+    def _run(mon) -> List[Action]:
+        try:
+            return mon.evaluate(positions, orders, ctx) or []
+        except Exception as e:
+            # don't crash the loop on monitor error
+            return [Alert(f"[monitor_error] {getattr(mon, 'name', mon.__class__.__name__)}: {e}")]
+
+    planned: List[Action] = []
+    for acts in (pool.map(_run, MONITORS) if pool is not None else map(_run, MONITORS)):
+        planned.extend(acts)
+    return planned
+
 def _next_tick(mt5, heartbeat_symbol: str, prev_time: Optional[int]) -> Optional[int]:
     """Poll the heartbeat symbol's last tick time; return new time if advanced."""
     try:
@@ -611,11 +634,23 @@ def run(log_level: str = typer.Option("INFO", "--log-level", "-l"),
     except Exception:
         pass
 
+    # digits/point are static per session: load them once instead of per-tick symbol_info calls
+    n_cached = warm_symbol_cache(mt5, sym_filter)
+    log.debug("SYMBOL_CACHE_WARMED | symbols=%d", n_cached)
+
     log.info("MONITOR_STARTED | heartbeat=%s interval=%.3fs filter=%s out=%s watchdog=%ds", 
              hb, iv, sym_filter, base_dir, watchdog_timeout)
 
     last_tick_time: Optional[int] = None
     last_log_time: float = 0.0  # for throttling log prints
+    last_env_map: Optional[Dict[str, str]] = None
+
+    # Monitors are independent and IPC-bound, so they can be evaluated concurrently (MONITOR_PARALLEL=1).
+    # Opt-in: the monitors call the MetaTrader5 module (ticks, symbol info, positions) from the pool
+    # threads, and that module is not documented as safe to call from several threads at once.
+    monitor_pool: Optional[ThreadPoolExecutor] = None
+    if len(MONITORS) > 1 and os.environ.get("MONITOR_PARALLEL", "0").lower() in ("1","true","yes","on"):
+        monitor_pool = ThreadPoolExecutor(max_workers=len(MONITORS), thread_name_prefix="monitor")
 
     try:
         while True:
@@ -642,20 +677,18 @@ def run(log_level: str = typer.Option("INFO", "--log-level", "-l"),
 
             # === Evaluate user monitors -> build an actions plan ===
             env_map = {k: v for k, v in os.environ.items() if k.startswith("MON_") or k.startswith("MONITOR_")}
+            # Keep the same mapping object while nothing changed so monitors skip re-configuring
+            if env_map == last_env_map:
+                env_map = last_env_map
+            last_env_map = env_map
             ctx = {
                 "now_ts": int(time.time()),
                 "env": env_map,
                 "router": router,
                 "mt5": mt5,
+                "ticks": {},  # symbol -> (bid, ask, last), shared by all monitors this tick
             }
-            planned_actions: List[Action] = []
-            for mon in MONITORS:
-                try:
-                    acts = mon.evaluate(positions, orders, ctx) or []
-                    planned_actions.extend(acts)
-                except Exception as e:
-                    # don't crash the loop on monitor error
-                    planned_actions.append(Alert(f"[monitor_error] {getattr(mon, 'name', mon.__class__.__name__)}: {e}"))
+            planned_actions = _evaluate_monitors(monitor_pool, positions, orders, ctx)
 
             # Write actions plan snapshots
             actions_dir = base_dir
@@ -697,6 +730,8 @@ def run(log_level: str = typer.Option("INFO", "--log-level", "-l"),
         # Cleanup
         log.info("Shutting down monitor components...")
         watchdog.shutdown()
+        if monitor_pool is not None:
+            monitor_pool.shutdown(wait=False)
         console.shutdown()
 
 
@@ -2,7 +2,9 @@
 from __future__ import annotations
 from typing import List, Dict, Any, Optional, Tuple
 import re
+from collections import defaultdict
 
+from app.common.database import get_db_manager
 from .actions import Action, DeleteOrder, ModifySLTP, Alert
 
 # ---- Utilities to filter/compute ----
@@ -14,9 +16,61 @@ def _is_tp2_like_leg(leg: Any) -> bool:
     """Legs 2,6,10,14,... i.e., leg ≡ 2 (mod 4) and leg >= 2."""
     return _is_int_leg(leg) and leg >= 2 and ((leg - 2) % 4 == 0)
 
+_PIP_ENV_KEYS: Dict[str, str] = {}
+
 def _pip_env_key(symbol: str) -> str:
     # Uppercase and replace all non-alnum with underscores (handles XAUUSD+ etc.)
-    return f"PIP_MULT_{re.sub(r'[^A-Z0-9]+', '_', symbol.upper())}"
+    key = _PIP_ENV_KEYS.get(symbol)
+    if key is None:
+        key = _PIP_ENV_KEYS[symbol] = f"PIP_MULT_{re.sub(r'[^A-Z0-9]+', '_', symbol.upper())}"
+    return key
+
+# Static per-symbol specs. digits/point never change during a session, so they are
+# read from MT5 once (warm_symbol_cache at startup, or lazily on first use).
+_DIGITS_CACHE: Dict[str, int] = {}
+_POINT_CACHE: Dict[str, float] = {}
+_PIP_CACHE: Dict[str, float] = {}
+
+# 1 pip = point * mult: 1/4-digit quotes count pips in points, everything else
+# (2,3,5-digit like XAUUSD+, JPY, 5-digit FX) in tenths of a pip.
+_PIP_MULT_BY_DIGITS: Dict[int, float] = {0: 10.0, 1: 1.0, 2: 10.0, 3: 10.0, 4: 1.0, 5: 10.0, 6: 10.0}
+
+def _cache_symbol_info(symbol: str, info: Any) -> None:
+    digits = int(getattr(info, "digits", 0) or 0)
+    point = float(getattr(info, "point", 0) or 0.0)
+    _DIGITS_CACHE[symbol] = digits
+    _POINT_CACHE[symbol] = point
+    _PIP_CACHE[symbol] = point * _PIP_MULT_BY_DIGITS.get(digits, 10.0)
+
+def _symbol_digits_point(mt5, symbol: str) -> Optional[Tuple[int, float]]:
+    digits = _DIGITS_CACHE.get(symbol)
+    if digits is None:
+        info = mt5.symbol_info(symbol)
+        if not info:
+            return None  # not cached: the symbol may become available later
+        _cache_symbol_info(symbol, info)
+        digits = _DIGITS_CACHE[symbol]
+    return digits, _POINT_CACHE[symbol]
+
+def warm_symbol_cache(mt5, symbols: Optional[List[str]] = None) -> int:
+    """
+    Preload digits/point/pip for the whole symbol universe with a single symbols_get() call.
+    `symbols` optionally restricts the warm-up to these (upper-case) names.
+    Returns the number of symbols cached; never raises.
+    """
+    try:
+        infos = mt5.symbols_get() or ()
+    except Exception:
+        return 0
+    wanted = set(symbols) if symbols else None
+    n = 0
+    for info in infos:
+        name = getattr(info, "name", None)
+        if not name or (wanted is not None and name.upper() not in wanted):
+            continue
+        _cache_symbol_info(name, info)
+        n += 1
+    return n
 
 def _one_pip(mt5, symbol: str, env: Dict[str, str]) -> Optional[float]:
     """
@@ -29,11 +83,9 @@ def _one_pip(mt5, symbol: str, env: Dict[str, str]) -> Optional[float]:
     try:
         if not symbol:
             return None
-        info = mt5.symbol_info(symbol)
-        if not info:
+        spec = _symbol_digits_point(mt5, symbol)
+        if spec is None:
             return None
-        point = float(getattr(info, "point", 0) or 0.0)
-        digits = int(getattr(info, "digits", 0) or 0)
         key = _pip_env_key(symbol)
         if key in env:
             try:
@@ -41,21 +93,55 @@ def _one_pip(mt5, symbol: str, env: Dict[str, str]) -> Optional[float]:
             except Exception:
                 mult = None
             if mult and mult > 0:
-                return point * mult
-        mult = 1.0 if digits in (1, 4) else 10.0
-        pip = point * mult
+                return spec[1] * mult
+        pip = _PIP_CACHE[symbol]
         return pip if pip > 0 else None
     except Exception:
         return None
 
 def _round_to_digits(mt5, symbol: str, price: float) -> float:
     try:
-        info = mt5.symbol_info(symbol)
-        digits = int(getattr(info, "digits", 0) or 0)
+        spec = _symbol_digits_point(mt5, symbol)
+        digits = spec[0] if spec else 0
         return round(float(price), digits)
     except Exception:
         return float(price)
 
+def _tick_prices(mt5, symbol: str, ticks: Dict[str, Tuple[float, float, float]]) -> Tuple[float, float, float]:
+    """
+    (bid, ask, last) for `symbol`, fetched at most once per tick: `ticks` is the
+    per-tick cache carried in ctx["ticks"]. Failed fetches are cached as zeros.
+    """
+    prices = ticks.get(symbol)
+    if prices is None:
+        try:
+            tick = mt5.symbol_info_tick(symbol)
+            prices = (float(getattr(tick, "bid", 0.0) or 0.0),
+                      float(getattr(tick, "ask", 0.0) or 0.0),
+                      float(getattr(tick, "last", 0.0) or 0.0))
+        except Exception:
+            prices = (0.0, 0.0, 0.0)
+        ticks[symbol] = prices
+    return prices
+
+_BOOL_TRUE = frozenset(("1", "true", "yes", "on"))
+
+def _env_bool(env: Dict[str, str], key: str, default: bool = False) -> bool:
+    raw = env.get(key)
+    if raw is None:
+        return default
+    return str(raw).lower() in _BOOL_TRUE
+
+def _sl_improves(side: str, current_sl: Optional[float], target_sl: Optional[float]) -> bool:
+    """True if target_sl tightens protection vs current_sl (an unset SL always improves)."""
+    if target_sl is None:
+        return False
+    if not current_sl:
+        return True
+    if side == "BUY":
+        return current_sl < target_sl
+    return side == "SELL" and current_sl > target_sl
+
 def _leg_to_layer(leg: Optional[int]) -> Optional[int]:
     """Map leg -> layer where each layer has 4 legs: 1-4->1, 5-8->2, 9-12->3, ..."""
     if isinstance(leg, int) and leg >= 1:
@@ -66,8 +152,26 @@ def _leg_to_layer(leg: Optional[int]) -> Optional[int]:
 
 class BaseMonitor:
     name: str = "base"
+    _env: Optional[Dict[str, str]] = None
+
+    def configure(self, env: Dict[str, str]) -> None:
+        """Derive flags/thresholds from env. Re-run only when the env mapping changes."""
+        self._env = env
+
+    def _configure_for(self, env: Dict[str, str]) -> None:
+        # The runner reuses the same env mapping until a MON_* var changes.
+        if env is not self._env:
+            self.configure(env)
+
     def evaluate(self, positions: List[Dict[str, Any]], orders: List[Dict[str, Any]], ctx: Dict[str, Any]) -> List[Action]:
-        """Return a list of Action instances. Never raise."""
+        """
+        Return a list of Action instances. Never raise.
+        Rows are already normalised by the account-monitor adapter
+        (_summarise_positions/_summarise_orders): ticket is int, price_open is float,
+        sl/tp are float or None (unset), leg is int or None -- no re-coercion here.
+        ctx: {"mt5", "env", "router", "now_ts", "ticks"}; "ticks" is a per-tick
+        symbol -> (bid, ask, last) cache shared by all monitors (see _tick_prices).
+        """
         return []
 
 # ---- Manage TP2 Hit ----
@@ -89,86 +193,53 @@ class ManageTP2HitMonitor(BaseMonitor):
     """
     name = "manage_tp2_hit"
 
-    def _max_tp2_candidate(self, positions: List[Dict[str, Any]], orders: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    @staticmethod
+    def _max_tp2_candidates(positions: List[Dict[str, Any]], orders: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
         """
-        Find the TP2 candidate with the MAXIMUM TP value (not the first one).
+        Find, per message_id, the TP2 candidate with the MAXIMUM TP value (not the first one).
         This prevents triggering on positions that have already been modified to BE+1pip.
+
+        Single pass over the flat snapshot: only the filter columns (message_id, leg, tp, side)
+        are read per row, and the original row is kept only for the winning candidate.
         """
-        # Collect all TP2-like candidates from positions and orders
-        all_tp2_candidates = []
-        
-        # Add TP2 positions with TP > 0
-        for p in positions:
-            if _is_tp2_like_leg(p.get("leg")):
-                tp = p.get("tp")
-                if tp and float(tp) > 0:
-                    all_tp2_candidates.append(p)
-        
-        # Add TP2 orders with TP > 0
-        for o in orders:
-            if _is_tp2_like_leg(o.get("leg")):
-                tp = o.get("tp")
-                if tp and float(tp) > 0:
-                    all_tp2_candidates.append(o)
-        
-        if not all_tp2_candidates:
-            return None
-        
-        # Find the candidate with the maximum TP value
-        # For BUY orders, we want the highest TP
-        # For SELL orders, we want the lowest TP (but still use max since we're looking for furthest from current price)
-        max_candidate = None
-        max_tp_distance = 0
-        
-        for candidate in all_tp2_candidates:
-            tp = float(candidate.get("tp", 0))
-            side = candidate.get("side")
-            
-            # For comparison, we need to consider the side
-            # BUY: higher TP is further from current price
-            # SELL: lower TP is further from current price
-            if side == "BUY":
-                tp_distance = tp  # Higher is further for BUY
-            elif side == "SELL":
-                tp_distance = -tp  # Lower (more negative) is further for SELL
-            else:
-                continue
-                
-            if max_candidate is None or tp_distance > max_tp_distance:
-                max_candidate = candidate
-                max_tp_distance = tp_distance
-        
-        return max_candidate
+        best: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        for rows in (positions, orders):
+            for r in rows:
+                mid = r.get("message_id")
+                if not mid or not _is_tp2_like_leg(r.get("leg")):
+                    continue
+                tp = r.get("tp")
+                if not tp or tp <= 0:
+                    continue
+                # BUY: higher TP is further from current price
+                # SELL: lower TP is further from current price
+                side = r.get("side")
+                if side == "BUY":
+                    tp_distance = tp
+                elif side == "SELL":
+                    tp_distance = -tp
+                else:
+                    continue
+                cur = best.get(mid)
+                if cur is None or tp_distance > cur[0]:
+                    best[mid] = (tp_distance, r)
+        return {mid: row for mid, (_, row) in best.items()}
 
-    def _price_exceeded(self, mt5, row: Dict[str, Any]) -> Tuple[bool, float, float]:
+    def _price_exceeded(self, mt5, row: Dict[str, Any], ticks: Dict[str, Tuple[float, float, float]]) -> Tuple[bool, float, float]:
         sym = row.get("symbol")
         side = row.get("side")  # "BUY" or "SELL"
-        tp = float(row.get("tp") or 0.0)
+        tp = row.get("tp") or 0.0
         if not sym or not side or tp <= 0:
             return False, 0.0, 0.0
-        try:
-            tick = mt5.symbol_info_tick(sym)
-            bid = float(getattr(tick, "bid", 0.0) or getattr(tick, "last", 0.0) or 0.0)
-            ask = float(getattr(tick, "ask", 0.0) or getattr(tick, "last", 0.0) or 0.0)
-        except Exception:
-            bid = ask = 0.0
+        bid, ask, last = _tick_prices(mt5, sym, ticks)
+        bid = bid or last
+        ask = ask or last
         if side == "BUY":
             return (bid >= tp and bid > 0), bid, ask
         elif side == "SELL":
             return (ask <= tp and ask > 0), bid, ask
         return False, bid, ask
 
-    def _improved_sl(self, side: str, current_sl: Optional[float], target_sl: float) -> bool:
-        if target_sl is None or not isinstance(target_sl, (int, float)):
-            return False
-        if current_sl in (None, 0):
-            return True
-        if side == "BUY":
-            return float(current_sl) < float(target_sl)
-        if side == "SELL":
-            return float(current_sl) > float(target_sl)
-        return False
-
     @staticmethod
     def _parse_keep_legs(env: Dict[str, str]) -> set:
         raw = str(env.get("MON_TP2_KEEP_LEGS", "") or "").strip()
@@ -180,36 +251,48 @@ class ManageTP2HitMonitor(BaseMonitor):
                     keep.add(int(tok))
         return keep
 
+    def configure(self, env):
+        super().configure(env)
+        self.debug = _env_bool(env, "MON_DEBUG_TP2")
+        self.keep_legs = self._parse_keep_legs(env)  # empty by default -> delete all
+
     def evaluate(self, positions, orders, ctx):
         mt5 = ctx.get("mt5")
         env = ctx.get("env", {})
-        debug = str(env.get("MON_DEBUG_TP2", "0")).lower() in ("1","true","yes","on")
-        keep_legs = self._parse_keep_legs(env)  # empty by default -> delete all
+        self._configure_for(env)
+        debug = self.debug
+        keep_legs = self.keep_legs
+
+        # Phase 1: TP2-like candidates only. Most ticks have none, in which case the
+        # full per-group build below is pure overhead (debug still reports every group).
+        candidates = self._max_tp2_candidates(positions, orders)
+        if not candidates and not debug:
+            return []
 
-        # Group rows by message_id
-        groups: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+        # Phase 2: group rows by message_id (only groups that can act, unless debugging)
+        groups: Dict[str, Dict[str, List[Dict[str, Any]]]] = defaultdict(lambda: {"positions": [], "orders": []})
         for p in positions:
             mid = p.get("message_id")
-            if mid:
-                groups.setdefault(mid, {"positions": [], "orders": []})["positions"].append(p)
+            if mid and (debug or mid in candidates):
+                groups[mid]["positions"].append(p)
         for o in orders:
             mid = o.get("message_id")
-            if mid:
-                groups.setdefault(mid, {"positions": [], "orders": []})["orders"].append(o)
+            if mid and (debug or mid in candidates):
+                groups[mid]["orders"].append(o)
 
+        ticks = ctx.setdefault("ticks", {})
         actions: List[Action] = []
 
         for mid, grp in groups.items():
-            # CHANGED: Use _max_tp2_candidate instead of _first_tp2_candidate
-            candidate = self._max_tp2_candidate(grp["positions"], grp["orders"])
+            candidate = candidates.get(mid)
             if not candidate:
                 if debug:
                     actions.append(Alert(f"[{self.name}] msg={mid} no TP2-like candidate with TP>0"))
                 continue
 
             sym = candidate.get("symbol"); side = candidate.get("side"); leg = candidate.get("leg")
-            tp = float(candidate.get("tp") or 0.0)
-            exceeded, bid, ask = self._price_exceeded(mt5, candidate)
+            tp = candidate.get("tp") or 0.0
+            exceeded, bid, ask = self._price_exceeded(mt5, candidate, ticks)
 
             if debug:
                 # Enhanced debug to show it's using the maximum TP
@@ -218,12 +301,15 @@ class ManageTP2HitMonitor(BaseMonitor):
             if not exceeded:
                 continue
 
+            emitted = 0  # DeleteOrder/ModifySLTP emitted for this group
+
             # (a) Delete all pending orders in the group, except any explicitly kept via MON_TP2_KEEP_LEGS.
             for o in grp["orders"]:
                 l = o.get("leg")
                 if isinstance(l, int) and l in keep_legs:
                     continue
-                actions.append(DeleteOrder(ticket=int(o["ticket"]), reason=f"{self.name}: TP2 exceeded msg={mid}, delete leg={l}"))
+                actions.append(DeleteOrder(ticket=o["ticket"], reason=f"{self.name}: TP2 exceeded msg={mid}, delete leg={l}"))
+                emitted += 1
 
             # (b) For every open position, set SL to entry +/- 1 pip (BUY +, SELL -), only if improves.
             for p in grp["positions"]:
@@ -233,18 +319,19 @@ class ManageTP2HitMonitor(BaseMonitor):
                     if debug:
                         actions.append(Alert(f"[{self.name}] msg={mid} ticket={p.get('ticket')} no pip size for {s}"))
                     continue
-                entry = float(p.get("price_open") or 0.0)
+                entry = p.get("price_open") or 0.0
                 sside = p.get("side")
                 target_sl = entry + pip if sside == "BUY" else entry - pip if sside == "SELL" else None
                 cur_sl = p.get("sl")
                 if target_sl is None:
                     continue
-                if self._improved_sl(sside, cur_sl, target_sl):
-                    actions.append(ModifySLTP(ticket=int(p["ticket"]), sl=float(target_sl), reason=f"{self.name}: lock +1 pip msg={mid}"))
+                if _sl_improves(sside, cur_sl, target_sl):
+                    actions.append(ModifySLTP(ticket=p["ticket"], sl=target_sl, reason=f"{self.name}: lock +1 pip msg={mid}"))
+                    emitted += 1
                 elif debug:
                     actions.append(Alert(f"[{self.name}] msg={mid} ticket={p.get('ticket')} SL unchanged (cur={cur_sl} target={target_sl})"))
 
-            if any(isinstance(a, (DeleteOrder, ModifySLTP)) for a in actions):
+            if emitted:
                 kept_str = f" (kept legs: {sorted(keep_legs)})" if keep_legs else ""
                 actions.append(Alert(f"[{self.name}] msg={mid} -> pending deleted{kept_str}, SL set to BE+/-1pip on open legs"))
 
@@ -283,58 +370,56 @@ class ManagePriceLayersMonitor(BaseMonitor):
         except Exception:
             return default
 
+    def configure(self, env):
+        super().configure(env)
+        self.debug = _env_bool(env, "MON_DEBUG_LAYERS")
+        self.min_pos_layer = self._get_env_int(env, "MON_LAYERS_MIN_POS_IN_LAYER", 1)
+        apply_to_n_lower_raw = str(env.get("MON_LAYERS_APPLY_TO_N_LOWER", "all")).strip().lower()
+        # None -> adjust all lower layers (default, also used for unparsable values)
+        try:
+            self.n_lower = None if apply_to_n_lower_raw == "all" else int(apply_to_n_lower_raw)
+        except Exception:
+            self.n_lower = None
+        self.eps_pips = self._get_env_float(env, "MON_LAYERS_TP_EPS_PIPS", 0.05)
+
     def evaluate(self, positions, orders, ctx):
         mt5 = ctx.get("mt5")
         env = ctx.get("env", {})
-        debug = str(env.get("MON_DEBUG_LAYERS", "0")).lower() in ("1","true","yes","on")
-        min_pos_layer = self._get_env_int(env, "MON_LAYERS_MIN_POS_IN_LAYER", 1)
-        apply_to_n_lower_raw = str(env.get("MON_LAYERS_APPLY_TO_N_LOWER", "all")).strip().lower()
-        eps_pips = self._get_env_float(env, "MON_LAYERS_TP_EPS_PIPS", 0.05)
-
-        # Group positions by message_id
-        groups: Dict[str, List[Dict[str, Any]]] = {}
+        self._configure_for(env)
+        debug = self.debug
+        min_pos_layer = self.min_pos_layer
+        n_lower = self.n_lower
+        eps_pips = self.eps_pips
+
+        # One pass: message_id -> side -> layer -> positions
+        groups: Dict[str, Dict[str, Dict[int, List[Dict[str, Any]]]]] = defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
         for p in positions:
             mid = p.get("message_id")
-            if mid:
-                groups.setdefault(mid, []).append(p)
+            if not mid:
+                continue
+            by_side = groups[mid]
+            side = p.get("side")
+            layer = _leg_to_layer(p.get("leg"))
+            if layer is None or side not in ("BUY", "SELL"):
+                continue
+            by_side[side][layer].append(p)
 
         actions: List[Action] = []
 
-        for mid, pos_list in groups.items():
+        for mid, by_side in groups.items():
             # Split by side to avoid mixing BUY/SELL logic
-            sides = ("BUY", "SELL")
-            for side in sides:
-                side_pos = [p for p in pos_list if p.get("side") == side and _is_int_leg(p.get("leg"))]
-                if not side_pos:
-                    continue
-
-                # Build layer -> list of positions mapping
-                layers: Dict[int, List[Dict[str, Any]]] = {}
-                for p in side_pos:
-                    layer = _leg_to_layer(p.get("leg"))
-                    if layer is None:
-                        continue
-                    layers.setdefault(layer, []).append(p)
-
+            for side in ("BUY", "SELL"):
+                layers = by_side.get(side)
                 if not layers:
                     continue
 
-                # Determine active layers (meeting min_pos_layer)
-                active_layers = sorted([L for L, plist in layers.items() if len(plist) >= min_pos_layer])
-                if not active_layers:
+                # Highest active layer (meeting min_pos_layer), then the active layers below it
+                highest_layer = max((L for L, plist in layers.items() if len(plist) >= min_pos_layer), default=None)
+                if highest_layer is None:
                     continue
-                highest_layer = max(active_layers)
-
-                # Decide which lower layers to affect
-                if apply_to_n_lower_raw == "all":
-                    target_layers = [L for L in active_layers if L < highest_layer]
-                else:
-                    try:
-                        n = int(apply_to_n_lower_raw)
-                        min_layer = max(1, highest_layer - n)
-                        target_layers = [L for L in active_layers if min_layer <= L < highest_layer]
-                    except Exception:
-                        target_layers = [L for L in active_layers if L < highest_layer]
+                min_layer = 1 if n_lower is None else max(1, highest_layer - n_lower)
+                target_layers = [L for L in sorted(layers)
+                                 if min_layer <= L < highest_layer and len(layers[L]) >= min_pos_layer]
 
                 if not target_layers:
                     if debug:
@@ -342,23 +427,23 @@ class ManagePriceLayersMonitor(BaseMonitor):
                     continue
 
                 # For each position in target lower layers: set TP to entry +/- 1 pip (per position), if meaningfully different
-                for layer in sorted(target_layers):
-                    for p in layers.get(layer, []):
+                for layer in target_layers:
+                    for p in layers[layer]:
                         sym = p.get("symbol")
                         pip = _one_pip(mt5, sym, env) if sym else None
                         if not pip or pip <= 0:
                             if debug:
                                 actions.append(Alert(f"[{self.name}] msg={mid} ticket={p.get('ticket')} no pip size for {sym}"))
                             continue
-                        entry = float(p.get("price_open") or 0.0)
+                        entry = p.get("price_open") or 0.0
                         target_tp = entry + pip if side == "BUY" else entry - pip
                         target_tp = _round_to_digits(mt5, sym, target_tp)
 
                         cur_tp = p.get("tp")
                         # Only update if current TP is None or differs by more than eps*pip
-                        needs_update = (cur_tp is None) or (abs(float(cur_tp) - target_tp) > (eps_pips * pip))
+                        needs_update = (cur_tp is None) or (abs(cur_tp - target_tp) > (eps_pips * pip))
                         if needs_update:
-                            actions.append(ModifySLTP(ticket=int(p["ticket"]), tp=float(target_tp),
+                            actions.append(ModifySLTP(ticket=p["ticket"], tp=target_tp,
                                                       reason=f"{self.name}: tighten TP to BE±1pip msg={mid} side={side} layer={layer}->{highest_layer}"))
                         elif debug:
                             actions.append(Alert(f"[{self.name}] msg={mid} ticket={p.get('ticket')} TP unchanged (cur={cur_tp} target={target_tp})"))
@@ -368,6 +453,38 @@ class ManagePriceLayersMonitor(BaseMonitor):
 
         return actions
 
+# TP of legs #1..#3 of a group. Equality on the leg number (text after '#') instead of
+# three '%#N' LIKE scans; the group_key lookup uses the (group_key, leg_tag) unique index.
+_TP_LEVELS_SQL = """
+    SELECT substr(leg_tag, instr(leg_tag, '#') + 1) AS leg_num, tp
+    FROM legs_index
+    WHERE group_key = ?
+      AND substr(leg_tag, instr(leg_tag, '#') + 1) IN ('1', '2', '3')
+      AND tp > 0
+    ORDER BY leg_tag
+"""
+
+def _trail_target_sl(is_buy: bool, price: float, tp1: float, tp2: float, tp3: float) -> Optional[float]:
+    """
+    Pure trailing rule on the group's TP levels (0 = level unknown). Returns the
+    unrounded target SL, or None when price has not reached a trailing level.
+    """
+    if is_buy:
+        # For BUY positions: price moves up through TPs
+        if tp3 > 0 and price >= tp3:
+            return tp2  # Price > TP3: SL = TP2
+        if tp2 > 0 and price >= tp2:
+            return tp1  # Price > TP2: SL = TP1
+        # tp1 > 0 and price >= tp1 -> SL = BE + 1 pip  <==== CURRENTLY TURNED OFF
+    else:
+        # For SELL positions: price moves down through TPs
+        if tp3 > 0 and price <= tp3:
+            return tp2  # Price < TP3: SL = TP2
+        if tp2 > 0 and price <= tp2:
+            return tp1  # Price < TP2: SL = TP1
+        # tp1 > 0 and price <= tp1 -> SL = BE - 1 pip  <==== CURRENTLY TURNED OFF
+    return None
+
 class TrailStopByTPLevelsMonitor(BaseMonitor):
     """
     Trail stop-loss based on TP levels from the database.
@@ -384,39 +501,27 @@ class TrailStopByTPLevelsMonitor(BaseMonitor):
       MON_TRAIL_ENABLED=1       # enable/disable monitor
     """
     name = "trail_stop_by_tp"
+    _db_manager = None
 
     def _get_tp_levels_from_db(self, message_id: str) -> Dict[int, float]:
         """
         Query the database for TP levels of the first 3 legs of a message.
         Returns dict: {1: tp1_value, 2: tp2_value, 3: tp3_value}
         """
-        from app.common.database import get_db_manager
-        
         try:
-            db_manager = get_db_manager()
+            if self._db_manager is None:
+                self._db_manager = get_db_manager()  # process-wide singleton
+            db_manager = self._db_manager
             
             # Build the group_key from message_id (format: OPEN_{message_id})
             group_key = f"OPEN_{message_id}"
             
-            # Query for legs 1, 2, 3 - leg_tag format is like "XAUUSD#1", "XAUUSD#2", etc.
-            rows = db_manager.fetchall("""
-                SELECT leg_tag, tp 
-                FROM legs_index 
-                WHERE group_key = ? 
-                AND (leg_tag LIKE '%#1' OR leg_tag LIKE '%#2' OR leg_tag LIKE '%#3')
-                ORDER BY leg_tag
-            """, (group_key,))
+            # Legs 1, 2, 3 - leg_tag format is like "XAUUSD#1", "XAUUSD#2", etc.
+            rows = db_manager.fetchall(_TP_LEVELS_SQL, (group_key,))
             
             tp_levels = {}
-            for leg_tag, tp in rows:
-                if tp and float(tp) > 0:
-                    # Extract leg number from leg_tag (e.g., "XAUUSD#1" -> 1)
-                    import re
-                    match = re.search(r'#(\d+)$', leg_tag)
-                    if match:
-                        leg_num = int(match.group(1))
-                        if leg_num in [1, 2, 3]:
-                            tp_levels[leg_num] = float(tp)
+            for leg_num, tp in rows:
+                tp_levels[int(leg_num)] = float(tp)
             
             return tp_levels
             
@@ -425,16 +530,13 @@ class TrailStopByTPLevelsMonitor(BaseMonitor):
                 print(f"[{self.name}] Error fetching TP levels for msg={message_id}: {e}")
             return {}
 
-    def _get_current_price(self, mt5, symbol: str, side: str) -> float:
-        """Get current market price (Bid for BUY, Ask for SELL)."""
-        try:
-            tick = mt5.symbol_info_tick(symbol)
-            if side == "BUY":
-                return float(getattr(tick, "bid", 0.0) or 0.0)
-            elif side == "SELL":
-                return float(getattr(tick, "ask", 0.0) or 0.0)
-        except Exception:
-            pass
+    def _get_current_price(self, mt5, symbol: str, side: str, ticks: Dict[str, Tuple[float, float, float]]) -> float:
+        """Get current market price (Bid for BUY, Ask for SELL) from the per-tick cache."""
+        bid, ask, _ = _tick_prices(mt5, symbol, ticks)
+        if side == "BUY":
+            return bid
+        elif side == "SELL":
+            return ask
         return 0.0
 
     def _determine_new_sl(self, position: Dict[str, Any], tp_levels: Dict[int, float], 
@@ -444,83 +546,48 @@ class TrailStopByTPLevelsMonitor(BaseMonitor):
         Returns None if no change needed.
         """
         side = position.get("side")
-        entry = float(position.get("price_open") or 0.0)
+        entry = position.get("price_open") or 0.0
         current_sl = position.get("sl")
         symbol = position.get("symbol")
         
-        if not side or not entry or not tp_levels:
+        if side not in ("BUY", "SELL") or not entry or not tp_levels:
             return None
-        
-        # Get TP values (ensure they exist)
-        tp1 = tp_levels.get(1, 0)
-        tp2 = tp_levels.get(2, 0)
-        tp3 = tp_levels.get(3, 0)
-        
-        # Calculate breakeven + 1 pip
-        be_plus_1 = entry + pip if side == "BUY" else entry - pip
-        
-        # Determine target SL based on price position
-        target_sl = None
-        
-        if side == "BUY":
-            # For BUY positions: price moves up through TPs
-            if tp3 > 0 and current_price >= tp3:
-                target_sl = tp2  # Price > TP3: SL = TP2
-            elif tp2 > 0 and current_price >= tp2:
-                target_sl = tp1  # Price > TP2: SL = TP1
-            # elif tp1 > 0 and current_price >= tp1:
-            #    target_sl = be_plus_1  # Price > TP1: SL = BE + 1 pip
-                
-        elif side == "SELL":
-            # For SELL positions: price moves down through TPs
-            if tp3 > 0 and current_price <= tp3:
-                target_sl = tp2  # Price < TP3: SL = TP2
-            elif tp2 > 0 and current_price <= tp2:
-                target_sl = tp1  # Price < TP2: SL = TP1
-            #elif tp1 > 0 and current_price <= tp1:
-            #    target_sl = be_plus_1  # Price < TP1: SL = BE - 1 pip
-        
+
+        target_sl = _trail_target_sl(side == "BUY", current_price,
+                                     tp_levels.get(1, 0), tp_levels.get(2, 0), tp_levels.get(3, 0))
         if target_sl is None:
             return None
-            
+
         # Round to symbol's digits
         target_sl = _round_to_digits(mt5, symbol, target_sl)
         
         # Only update if it improves protection (don't move SL against position)
-        if self._improved_sl(side, current_sl, target_sl):
+        if _sl_improves(side, current_sl, target_sl):
             return target_sl
             
         return None
 
-    def _improved_sl(self, side: str, current_sl: Optional[float], target_sl: float) -> bool:
-        """Check if target SL is an improvement over current SL."""
-        if target_sl is None:
-            return False
-        if current_sl in (None, 0):
-            return True
-        if side == "BUY":
-            return float(target_sl) > float(current_sl)
-        elif side == "SELL":
-            return float(target_sl) < float(current_sl)
-        return False
+    def configure(self, env):
+        super().configure(env)
+        self.enabled = _env_bool(env, "MON_TRAIL_ENABLED", True)
+        self.debug = _env_bool(env, "MON_DEBUG_TRAIL")
 
     def evaluate(self, positions, orders, ctx):
         mt5 = ctx.get("mt5")
         env = ctx.get("env", {})
-        
+        self._configure_for(env)
+
         # Check if monitor is enabled
-        enabled = str(env.get("MON_TRAIL_ENABLED", "1")).lower() in ("1", "true", "yes", "on")
-        if not enabled:
+        if not self.enabled:
             return []
-            
-        self.debug = str(env.get("MON_DEBUG_TRAIL", "0")).lower() in ("1", "true", "yes", "on")
-        
+
+        ticks = ctx.setdefault("ticks", {})
         # Group positions by message_id
-        groups: Dict[str, List[Dict[str, Any]]] = {}
+        groups: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
         for p in positions:
             mid = p.get("message_id")
             if mid:
-                groups.setdefault(mid, []).append(p)
+                groups[mid].append(p)
         
         actions: List[Action] = []
         
@@ -537,6 +604,11 @@ class TrailStopByTPLevelsMonitor(BaseMonitor):
                 tp_str = ", ".join([f"TP{k}={v:.5f}" for k, v in sorted(tp_levels.items())])
                 actions.append(Alert(f"[{self.name}] msg={mid} found TPs: {tp_str}"))
             
+            # Only TP2/TP3 crossings trail (TP1 -> BE is off): without either level nothing can fire
+            tp1, tp2, tp3 = tp_levels.get(1, 0), tp_levels.get(2, 0), tp_levels.get(3, 0)
+            if not self.debug and not (tp2 > 0 or tp3 > 0):
+                continue
+
             # Process each position in the group
             for p in pos_list:
                 symbol = p.get("symbol")
@@ -544,6 +616,13 @@ class TrailStopByTPLevelsMonitor(BaseMonitor):
                 
                 if not symbol or not side:
                     continue
+
+                # Cheap pre-filter on the cached tick: skip pip/rounding work while price is short
+                # of the trailing levels (debug keeps the full path for its per-position alerts)
+                if not self.debug:
+                    price = self._get_current_price(mt5, symbol, side, ticks)
+                    if price <= 0 or _trail_target_sl(side == "BUY", price, tp1, tp2, tp3) is None:
+                        continue
                 
                 # Get pip value
                 pip = _one_pip(mt5, symbol, env)
@@ -553,7 +632,7 @@ class TrailStopByTPLevelsMonitor(BaseMonitor):
                     continue
                 
                 # Get current market price
-                current_price = self._get_current_price(mt5, symbol, side)
+                current_price = self._get_current_price(mt5, symbol, side, ticks)
                 if current_price <= 0:
                     continue
                 
@@ -561,7 +640,7 @@ class TrailStopByTPLevelsMonitor(BaseMonitor):
                 new_sl = self._determine_new_sl(p, tp_levels, current_price, pip, mt5)
                 
                 if new_sl is not None:
-                    ticket = int(p["ticket"])
+                    ticket = p["ticket"]
                     current_sl = p.get("sl")
                     
                     # Format current_sl safely - handle None values
@@ -569,7 +648,7 @@ class TrailStopByTPLevelsMonitor(BaseMonitor):
                     
                     # Determine which TP level we're trailing to
                     level_desc = ""
-                    entry = float(p.get("price_open") or 0.0)
+                    entry = p.get("price_open") or 0.0
                     be_plus_1 = entry + pip if side == "BUY" else entry - pip
                     
                     if abs(new_sl - be_plus_1) < pip * 0.1:
@@ -581,7 +660,7 @@ class TrailStopByTPLevelsMonitor(BaseMonitor):
                     
                     actions.append(ModifySLTP(
                         ticket=ticket, 
-                        sl=float(new_sl),
+                        sl=new_sl,
                         reason=f"{self.name}: trail to {level_desc} msg={mid} (was {current_sl_str})"
                     ))
                     
@@ -6,12 +6,18 @@ import hashlib
 import logging
 import os
 import csv
+import functools
 import re
+import struct
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Set
-from app.engine.semantic import load_semantic_dictionary, evaluate as sem_evaluate
+from itertools import groupby
+from operator import itemgetter
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, Optional, Set
+from app.engine.semantic import load_semantic_dictionary_cached, evaluate as sem_evaluate
 from app.refindex import record_open, generate_mock_ack_for_open, resolve_group_key, list_open_legs, update_leg_targets
 from .models import Action, Leg, Side
+from pydantic import TypeAdapter
 
 # Import risk-free processing (will be created as a new file)
 # Import risk-free processing
@@ -39,7 +45,7 @@ log = logging.getLogger('processing')
 # --- Refactor: central config with runtime apply/reload (keeps single-file) ---
 from dataclasses import dataclass
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Config:
     semantic_dict_path: str = os.getenv('SEMANTIC_DICT_PATH', 'runtime/data/parser_semantic.yaml')
     failsafe_on_unparsed: bool = os.getenv('ENGINE_FAILSAFE_ON_UNPARSED', 'true').lower() in ('1','true','yes')
@@ -50,6 +56,10 @@ class Config:
     enable_ignore_gate: bool = get_flag('ENGINE_ENABLE_IGNORE_GATE', False)
     default_symbol: str = os.getenv('DEFAULT_SYMBOL', 'XAUUSD').upper()
     signal_min_text_len: int = int(os.getenv('SIGNAL_MIN_TEXT_LEN', '8'))
+    parse_cache: bool = get_flag('ENGINE_PARSE_CACHE', True)
+
+# Active configuration; replaced wholesale by apply_config(), read as CFG.<field> everywhere
+CFG: Config = Config()
 
 
 def _log_emit(event: str, *, action=None, gk=None, source_msg_id=None, reason: str | None = None) -> None:
@@ -78,19 +88,9 @@ def load_config_from_env() -> Config:
     return Config()
 
 def apply_config(cfg: Config) -> None:
-    """Apply config values to module-level constants for backward compatibility."""
-    global SEMANTIC_DICT_PATH, ENGINE_FAILSAFE_ON_UNPARSED, MAX_LEGS, DEFAULT_LEG_VOLUME
-    global SIGNAL_REQUIRE_SYMBOL, SIGNAL_REQUIRE_PRICE, ENGINE_ENABLE_IGNORE_GATE
-    global DEFAULT_SYMBOL, SIGNAL_MIN_TEXT_LEN
-    SEMANTIC_DICT_PATH = cfg.semantic_dict_path
-    ENGINE_FAILSAFE_ON_UNPARSED = cfg.failsafe_on_unparsed
-    MAX_LEGS = cfg.max_legs
-    DEFAULT_LEG_VOLUME = cfg.default_leg_volume
-    SIGNAL_REQUIRE_SYMBOL = cfg.require_symbol
-    SIGNAL_REQUIRE_PRICE = cfg.require_price
-    ENGINE_ENABLE_IGNORE_GATE = cfg.enable_ignore_gate
-    DEFAULT_SYMBOL = cfg.default_symbol
-    SIGNAL_MIN_TEXT_LEN = cfg.signal_min_text_len
+    """Make cfg the active configuration."""
+    global CFG
+    CFG = cfg
 
 def init_processing(cfg: Config | None = None) -> None:
     """Initialize processing module once: config + semantic dict banner."""
@@ -100,20 +100,14 @@ def init_processing(cfg: Config | None = None) -> None:
     cfg = cfg or load_config_from_env()
     apply_config(cfg)
     try:
-        # reload semantic dict based on possibly new path
-        _SEM_DICT = load_semantic_dictionary(SEMANTIC_DICT_PATH)
+        # reload semantic dict based on possibly new path (no-op parse if the file is unchanged)
+        _SEM_DICT = load_semantic_dictionary_cached(CFG.semantic_dict_path)
+        _ignore_re_for(_SEM_DICT)
     except Exception as _e:
         logging.getLogger('processing').warning('SEMANTIC_DICT_LOAD_WARN %s', _e, extra={'event':'SEMANTIC_DICT_LOAD_WARN'})
     _log_rules_state_once()
     _CFG_INITIALIZED = True
 # --- end config block ---
-SEMANTIC_DICT_PATH = os.getenv('SEMANTIC_DICT_PATH', 'runtime/data/parser_semantic.yaml')
-ENGINE_FAILSAFE_ON_UNPARSED = os.getenv('ENGINE_FAILSAFE_ON_UNPARSED', 'true').lower() in ('1', 'true', 'yes')
-MAX_LEGS = int(os.getenv('MAX_LEGS', '10'))
-DEFAULT_LEG_VOLUME = float(os.getenv('DEFAULT_LEG_VOLUME', '0.01'))
-SIGNAL_REQUIRE_SYMBOL = os.getenv('SIGNAL_REQUIRE_SYMBOL', 'false').lower() in ('1', 'true', 'yes')
-SIGNAL_REQUIRE_PRICE = os.getenv('SIGNAL_REQUIRE_PRICE', 'true').lower() in ('1', 'true', 'yes')
-ENGINE_ENABLE_IGNORE_GATE = get_flag('ENGINE_ENABLE_IGNORE_GATE', False)
 
 def _truncate_for_log(s, max_chars=600, max_lines=10):
     if s is None:
@@ -128,18 +122,35 @@ def _truncate_for_log(s, max_chars=600, max_lines=10):
         return s[:max_chars] + '... [truncated ' + str(len(s) - max_chars) + ' chars]'
     return s
 
+_IGNORE_RE: Optional[re.Pattern] = None
+_IGNORE_RE_SRC: Any = None
+
+def _ignore_re_for(sem) -> Optional[re.Pattern]:
+    """One alternation over all ignore_rules.contains phrases.
+
+    Compiled eagerly whenever the semantic dict is (re)loaded; the identity check only
+    catches a dict swapped in some other way.
+    """
+    global _IGNORE_RE, _IGNORE_RE_SRC
+    if _IGNORE_RE_SRC is not sem:
+        ir = (getattr(sem, 'data', None) or {}).get('ignore_rules') or {}
+        if not isinstance(ir, dict):
+            ir = {}
+        contains_list = [c for c in ir.get('contains') or [] if isinstance(c, str) and c.strip()]
+        # Phrases are lowered and matched against lowered text: same semantics as `phrase.lower() in text.lower()`
+        _IGNORE_RE = re.compile('|'.join(re.escape(c.lower()) for c in contains_list)) if contains_list else None
+        _IGNORE_RE_SRC = sem
+    return _IGNORE_RE
+
 def _maybe_ack_ignore(source_msg_id, text, unparsed_raw_msg=None):
-    if not ENGINE_ENABLE_IGNORE_GATE:
+    if not CFG.enable_ignore_gate:
         return False
     try:
-        ir = (_SEM_DICT.data or {}).get('ignore_rules') or {}
-        contains_list = [c for c in ir.get('contains') or [] if isinstance(c, str) and c.strip()]
-        tlow = (text or '').lower()
-        matched_phrase = None
-        for phrase in contains_list:
-            if phrase.lower() in tlow:
-                matched_phrase = phrase
-                break
+        ignore_re = _ignore_re_for(_SEM_DICT)
+        if ignore_re is None:
+            return False
+        m = ignore_re.search((text or '').lower())
+        matched_phrase = m.group(0) if m else None
         if matched_phrase:
             try:
                 msg = _truncate_for_log(text or '')
@@ -155,18 +166,48 @@ def _maybe_ack_ignore(source_msg_id, text, unparsed_raw_msg=None):
     except Exception:
         return False
     return False
-_SEM_DICT = load_semantic_dictionary(SEMANTIC_DICT_PATH)
-DEFAULT_SYMBOL = os.getenv('DEFAULT_SYMBOL', 'XAUUSD').upper()
-SIGNAL_MIN_TEXT_LEN = int(os.getenv('SIGNAL_MIN_TEXT_LEN', '8'))
+_SEM_DICT = load_semantic_dictionary_cached(CFG.semantic_dict_path)
+_ignore_re_for(_SEM_DICT)
 CHAT_ID_WHITELIST: Set[int] = set((int(x) for x in os.getenv('SIGNAL_CHAT_ID_WHITELIST', '').split(',') if x.strip().lstrip('+-').isdigit()))
 SENDER_WHITELIST: Set[str] = set((x.strip().lower() for x in os.getenv('SIGNAL_SENDER_WHITELIST', '').split(',') if x.strip()))
-_SIDE_RE = re.compile('\\b(BUY|SELL)\\b', re.I)
-ENTRY_RE = re.compile('^\\s*(?:BUY|SELL)\\s*@\\s*(\\d+(?:\\.\\d+)?)(?:\\s*/\\s*(\\d+(?:\\.\\d+)?))?', re.I | re.M)
-TP_LINE_RE = re.compile('\\b(TP)\\s+(OPEN|\\d+(?:\\.\\d+)?)\\b', re.I)
-SL_RE = re.compile('\\bSL\\s+(\\d+(?:\\.\\d+)?)\\b', re.I)
-_SYMBOL_RE = re.compile('^\\s*([A-Z]{3,10}\\d{0,2})\\s*$', re.M)
-SLIP_RE = re.compile('\\b(?:slip|slippage|max\\s*slip)\\s*[:=]?\\s*(\\d+(?:\\.\\d+)?)\\s*(?:pip|pips|pt|points)?', re.I)
-WORSE_RE = re.compile('\\b(?:worse(?:\\s*pips?)?)\\s*[:=]?\\s*(\\d+(?:\\.\\d+)?)', re.I)
+# Optional RE2 (google-re2) engine for the parser patterns; import-time opt-in, stdlib re otherwise.
+# RE2's \b and \s are ASCII-only, hence off by default.
+ENGINE_USE_RE2 = get_flag('ENGINE_USE_RE2', False)
+_re_engine = re
+if ENGINE_USE_RE2:
+    try:
+        import re2 as _re_engine
+    except ImportError:
+        log.warning('ENGINE_USE_RE2 set but google-re2 is not installed; using stdlib re')
+
+def _compile_rx(pattern: str, flags: int=0):
+    if _re_engine is not re:
+        inline = ('i' if flags & re.I else '') + ('m' if flags & re.M else '')
+        try:
+            return _re_engine.compile(f'(?{inline}){pattern}' if inline else pattern)
+        except Exception:
+            log.warning('RE2 rejected pattern %r; using stdlib re', pattern)
+    return re.compile(pattern, flags)
+
+_SIDE_RE = _compile_rx('\\b(BUY|SELL)\\b', re.I)
+ENTRY_RE = _compile_rx('^\\s*(?:BUY|SELL)\\s*@\\s*(\\d+(?:\\.\\d+)?)(?:\\s*/\\s*(\\d+(?:\\.\\d+)?))?', re.I | re.M)
+TP_LINE_RE = _compile_rx('\\b(TP)\\s+(OPEN|\\d+(?:\\.\\d+)?)\\b', re.I)
+SL_RE = _compile_rx('\\bSL\\s+(\\d+(?:\\.\\d+)?)\\b', re.I)
+_SYMBOL_RE = _compile_rx('^\\s*([A-Z]{3,10}\\d{0,2})\\s*$', re.M)
+_RESERVED_SYMBOL_WORDS = frozenset({'TP', 'SL', 'BUY', 'SELL', 'TP1', 'TP2', 'TP3', 'TP4', 'TP5'})
+_PREFERRED_SYMBOLS = frozenset({'XAUUSD', 'XAGUSD', 'EURUSD', 'GBPUSD', 'USDJPY', 'US30', 'GER40'})
+# The patterns above fused into one alternation for parse_signal_text. Entry is tried before
+# side so an entry line also supplies the side; the standalone regexes stay for other callers.
+_SIGNAL_TOKEN_RE = _compile_rx(
+    r'(?P<entry>^\s*(?P<entry_side>BUY|SELL)\s*@\s*(?P<entry1>\d+(?:\.\d+)?)(?:\s*/\s*(?P<entry2>\d+(?:\.\d+)?))?)'
+    r'|(?P<side>\b(?:BUY|SELL)\b)'
+    r'|(?P<tp>\bTP\s+(?P<tp_val>OPEN|\d+(?:\.\d+)?)\b)'
+    r'|(?P<sl>\bSL\s+(?P<sl_val>\d+(?:\.\d+)?)\b)'
+    r'|(?P<slip>\b(?:slip|slippage|max\s*slip)\s*[:=]?\s*(?P<slip_val>\d+(?:\.\d+)?))'
+    r'|(?P<worse>\bworse(?:\s*pips?)?\s*[:=]?\s*(?P<worse_val>\d+(?:\.\d+)?))',
+    re.I | re.M)
+SLIP_RE = _compile_rx('\\b(?:slip|slippage|max\\s*slip)\\s*[:=]?\\s*(\\d+(?:\\.\\d+)?)\\s*(?:pip|pips|pt|points)?', re.I)
+WORSE_RE = _compile_rx('\\b(?:worse(?:\\s*pips?)?)\\s*[:=]?\\s*(\\d+(?:\\.\\d+)?)', re.I)
 _rules_state_logged = False
 
 def _log_rules_state_once() -> None:
@@ -180,12 +221,20 @@ def _log_rules_state_once() -> None:
         pass
     _rules_state_logged = True
 
+_CLIENT_ID_CHARS = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789_')
+_CLIENT_ID_BAD_RE = re.compile('[^A-Za-z0-9_]+')
+
 def _client_id_for_message(symbol: str, source_msg_id: str) -> str:
     base = f'{symbol}_{source_msg_id}'.strip()
-    clean = re.sub('[^A-Za-z0-9_]+', '_', base)
-    return clean
+    # Symbol + numeric message id is almost always clean already; only run the regex when it isn't
+    if _CLIENT_ID_CHARS.issuperset(base):
+        return base
+    return _CLIENT_ID_BAD_RE.sub('_', base)
 
 class ParseSignal:
+    # Optional extras some callers attach; class-level defaults keep attribute access direct
+    symbols: tuple[str, ...] = ()
+    meta: Optional[Any] = None
 
     def __init__(self, *, side: Optional[Side]=None, symbol: Optional[str]=None, entries: Optional[list[float]]=None, tps: Optional[list[Optional[float]]]=None, sl: Optional[float]=None, max_slip_pips: Optional[float]=None, raw: str='') -> None:
         self.side = side
@@ -195,71 +244,96 @@ class ParseSignal:
         self.sl = sl
         self.max_slip_pips = max_slip_pips
         self.raw = raw
+        self._tp_profile = None
 
+    def tp_profile(self) -> tuple[list[float], bool]:
+        """(numeric TPs, has TP OPEN), computed once per tps list; callers must not mutate the result."""
+        prof = self._tp_profile
+        if prof is None or prof[0] is not self.tps:
+            tps = self.tps or []
+            prof = (self.tps, [t for t in tps if t is not None], any((t is None for t in tps)))
+            self._tp_profile = prof
+        return prof[1], prof[2]
+
+
+# Zero-width chars and the emoji block; whitespace (including \n, \r, \t) is kept
+_CLEAN_RE = re.compile(r'[\u200B-\u200D\uFEFF\U0001F300-\U0001FAFF]')
 
 def _preclean_text(s: str) -> str:
     """Strip zero-width chars and emojis, but **preserve** newlines and whitespace."""
-    if not s:
-        return ''
-    # Remove zero-width chars
-    s = re.sub(r'[\u200B-\u200D\uFEFF]', '', s)
-    # Remove emoji range only; keep whitespace (including \n, \r, \t)
-    def _keep(ch: str) -> bool:
-        code = ord(ch)
-        if 0x1F300 <= code <= 0x1FAFF:
-            return False  # emoji
-        return True  # keep everything else
-    return ''.join(ch for ch in s if _keep(ch))
+    return _CLEAN_RE.sub('', s) if s else ''
 
 def parse_signal_text(text: str) -> ParseSignal:
     raw = text or ''
+    # Edits/retries re-deliver identical texts; the memo holds immutable field tuples and
+    # every call gets its own ParseSignal/lists, so callers can't poison the cache.
+    parse = _parse_signal_fields if CFG.parse_cache else _parse_signal_fields.__wrapped__
+    side, symbol, entries, tps, sl, max_slip = parse(raw)
+    return ParseSignal(side=side, symbol=symbol, entries=list(entries), tps=list(tps), sl=sl, max_slip_pips=max_slip, raw=raw)
+
+@functools.lru_cache(maxsize=4096)
+def _parse_signal_fields(raw: str) -> tuple:
+    """Pure parse of raw text -> (side, symbol, entries, tps, sl, max_slip_pips) with tuple lists."""
     s = _preclean_text(raw).strip()
-    m = _SIDE_RE.search(s)
-    side: Optional[Side] = m.group(1).upper() if m else None
+    side: Optional[Side] = None
     symbol: Optional[str] = None
-    cand_syms = [g for g in _SYMBOL_RE.findall(s)]
-    if cand_syms:
-        reserved = {'TP','SL','BUY','SELL','TP1','TP2','TP3','TP4','TP5'}
-        cand_syms = [c for c in cand_syms if c.upper() not in reserved]
-        preferred = [c for c in cand_syms if c.upper() in ('XAUUSD', 'XAGUSD', 'EURUSD', 'GBPUSD', 'USDJPY', 'US30', 'GER40')]
-        if cand_syms:
-            symbol = (preferred[0] if preferred else cand_syms[0]).upper()
+    # First preferred symbol wins; otherwise the first non-reserved candidate line
+    for m in _SYMBOL_RE.finditer(s):
+        c = m.group(1).upper()
+        if c in _RESERVED_SYMBOL_WORDS:
+            continue
+        if c in _PREFERRED_SYMBOLS:
+            symbol = c
+            break
+        if symbol is None:
+            symbol = c
     entries: list[float] = []
-    m = ENTRY_RE.search(s)
-    if m:
-        e1 = float(m.group(1))
-        e2 = float(m.group(2)) if m.group(2) else None
-        entries = [e1] if e2 is None else [e1, e2]
     tps: list[Optional[float]] = []
-    for m in TP_LINE_RE.finditer(s):
-        v = m.group(2).upper()
-        tps.append(None if v == 'OPEN' else float(v))
     sl = None
-    m = SL_RE.search(s)
-    if m:
-        sl = float(m.group(1))
-    max_slip = None
-    for pat in (SLIP_RE, WORSE_RE):
-        m = pat.search(s)
-        if m:
-            try:
-                max_slip = float(m.group(1))
-                break
-            except Exception:
-                pass
-    return ParseSignal(side=side, symbol=symbol, entries=entries, tps=tps, sl=sl, max_slip_pips=max_slip, raw=raw)
+    slip = worse = None
+    # One pass over the text; only the first side/entry/SL/slip/worse hit counts, every TP counts
+    for m in _SIGNAL_TOKEN_RE.finditer(s):
+        kind = m.lastgroup
+        if kind == 'tp':
+            v = m.group('tp_val').upper()
+            tps.append(None if v == 'OPEN' else float(v))
+        elif kind == 'side':
+            if side is None:
+                side = m.group('side').upper()
+        elif kind == 'entry':
+            if side is None:
+                side = m.group('entry_side').upper()
+            if not entries:
+                e2 = m.group('entry2')
+                entries = [float(m.group('entry1'))] if e2 is None else [float(m.group('entry1')), float(e2)]
+        elif kind == 'sl':
+            if sl is None:
+                sl = float(m.group('sl_val'))
+        elif kind == 'slip':
+            if slip is None:
+                slip = float(m.group('slip_val'))
+        elif kind == 'worse':
+            if worse is None:
+                worse = float(m.group('worse_val'))
+    max_slip = slip if slip is not None else worse
+    return (side, symbol, tuple(entries), tuple(tps), sl, max_slip)
 
 def _has_price_info(ps: ParseSignal) -> bool:
     return bool(ps.entries) or ps.sl is not None or any((tp is not None for tp in ps.tps))
 
 def _is_valid_signal(ps: ParseSignal, raw: str, *, chat_id: Optional[int]=None, sender_username: Optional[str]=None) -> bool:
-    if len((raw or '').strip()) < SIGNAL_MIN_TEXT_LEN:
+    cfg = CFG
+    r = raw or ''
+    # strip() can only shorten, and is a no-op unless an end is whitespace: only copy when it matters
+    if len(r) < cfg.signal_min_text_len:
+        return False
+    if r and (r[0].isspace() or r[-1].isspace()) and len(r.strip()) < cfg.signal_min_text_len:
         return False
     if ps.side is None:
         return False
-    if SIGNAL_REQUIRE_SYMBOL and (not ps.symbol):
+    if cfg.require_symbol and (not ps.symbol):
         return False
-    if SIGNAL_REQUIRE_PRICE and (not _has_price_info(ps)):
+    if cfg.require_price and (not _has_price_info(ps)):
         return False
     if CHAT_ID_WHITELIST and chat_id is not None and (chat_id not in CHAT_ID_WHITELIST):
         return False
@@ -267,11 +341,20 @@ def _is_valid_signal(ps: ParseSignal, raw: str, *, chat_id: Optional[int]=None,
         return False
     return True
 
+_PIP_VALUES: Dict[str, float] = {}
+
 def _pip_value(symbol: str) -> float:
-    sym = (symbol or '').upper()
-    if 'JPY' in sym:
-        return 0.01
-    return 0.1 if sym.startswith('XAU') else 0.0001
+    # Memoised on the symbol as given, so warm calls skip upper() and the substring checks
+    key = symbol or ''
+    v = _PIP_VALUES.get(key)
+    if v is None:
+        sym = key.upper()
+        if 'JPY' in sym:
+            v = 0.01
+        else:
+            v = 0.1 if sym.startswith('XAU') else 0.0001
+        _PIP_VALUES[key] = v
+    return v
 
 def _is_same_price(a: Optional[float], b: Optional[float], symbol: str) -> bool:
     if a is None or b is None:
@@ -281,18 +364,18 @@ def _is_same_price(a: Optional[float], b: Optional[float], symbol: str) -> bool:
 
 def _tp_block_from_list(tp_values: list[Optional[float]], has_open: bool) -> list[Optional[float]]:
     nums = [t for t in tp_values if t is not None]
-    blk: list[Optional[float]] = list(nums[:4])
-    while len(blk) < 4:
-        blk.append(blk[-1] if blk else None)
-    if has_open:
-        blk[3] = None
-    return blk[:4]
+    # Fixed 4 slots: missing ones repeat the previous TP, the last is OPEN (None) when flagged
+    n = len(nums)
+    a = nums[0] if n else None
+    b = nums[1] if n > 1 else a
+    c = nums[2] if n > 2 else b
+    d = None if has_open else (nums[3] if n > 3 else c)
+    return [a, b, c, d]
 
 def _tps_for_legs(ps: ParseSignal, legs_count: int) -> list[Optional[float]]:
     if legs_count <= 0:
         return []
-    numeric = [t for t in ps.tps or [] if t is not None]
-    has_open = any((t is None for t in ps.tps or []))
+    numeric, has_open = ps.tp_profile()
 
     def block4(vals: list[float]) -> list[Optional[float]]:
         if not vals:
@@ -335,17 +418,21 @@ def _tps_for_legs(ps: ParseSignal, legs_count: int) -> list[Optional[float]]:
         out[pos] = numeric[idx]
     return out
 
+_LEG_PRICES = struct.Struct('>ddd')
+_NAN = float('nan')
+
 def _make_action_id(action_type: str, source_msg_id: str, legs: List[Leg]) -> str:
-    blob = f'{action_type}|{source_msg_id}|{[(l.symbol, l.side, l.leg_id, l.tp, l.sl, l.entry) for l in legs]}'
-    h = hashlib.sha1(blob.encode('utf-8'), usedforsecurity=False).hexdigest()[:10]
+    # Streamed into blake2b (5-byte digest = 10 hex chars) instead of hashing a repr of every leg
+    h = hashlib.blake2b(f'{action_type}|{source_msg_id}'.encode('utf-8'), digest_size=5)
+    pack = _LEG_PRICES.pack
+    for l in legs:
+        h.update(pack(_NAN if l.entry is None else l.entry, _NAN if l.sl is None else l.sl, _NAN if l.tp is None else l.tp))
+        h.update(f'|{l.symbol}|{l.side}|{l.leg_id}|'.encode('utf-8'))
+    h = h.hexdigest()
     dt = datetime.utcnow().strftime('%Y%m%d-%H%M%S')
     return f'{action_type}-{dt}-{h}'
 
-def _make_leg_id(client_id: str, leg_no: int) -> str:
-    return f'{client_id}#{leg_no}'
-
 def _coalesce_modify_legs(legs: list[Leg], gk: str) -> list[Leg]:
-    grouped: dict[str, list[Leg]] = {}
 
     def _key_for(l: Leg) -> str:
         if getattr(l, 'position_ticket', None):
@@ -353,18 +440,23 @@ def _coalesce_modify_legs(legs: list[Leg], gk: str) -> list[Leg]:
         if getattr(l, 'order_ticket', None):
             return f'ord:{l.order_ticket}'
         return f"tag:{getattr(l, 'tag', getattr(l, 'leg_id', ''))}"
-    for _l in legs:
-        grouped.setdefault(_key_for(_l), []).append(_l)
+    # One sort by (key, tag, original index) then groupby; groups are emitted in first-appearance order
+    keyed = sorted((_key_for(l), str(getattr(l, 'tag', getattr(l, 'leg_id', ''))), i, l) for i, l in enumerate(legs))
+    grouped = []
+    for k, grp in groupby(keyed, key=itemgetter(0)):
+        items = list(grp)
+        grouped.append((min(t[2] for t in items), k, [t[3] for t in items]))
+    grouped.sort(key=itemgetter(0))
     out: list[Leg] = []
-    for k, arr in grouped.items():
+    for _, k, arr in grouped:
         if k.startswith('pos:') or k.startswith('ord:'):
-            arr_sorted = sorted(arr, key=lambda l: str(getattr(l, 'tag', getattr(l, 'leg_id', ''))))
-            keep = arr_sorted[0]
-            dropped = arr_sorted[1:]
+            keep = arr[0]
+            dropped = arr[1:]
             if dropped:
                 logging.getLogger('processing').info('MGMT_COALESCE', extra={'event': 'MGMT_COALESCE', 'gk': gk, 'ticket_key': k, 'kept': getattr(keep, 'tag', keep.leg_id), 'dropped': [getattr(x, 'tag', x.leg_id) for x in dropped]})
             out.append(keep)
         else:
+            # tag groups share one tag, so the sort kept their original order
             out.extend(arr)
     return out
 
@@ -392,6 +484,21 @@ def _reason_for_unparsed(ps: ParseSignal, raw: str) -> str:
         return 'MISSING_AT'
     return 'NO_MATCH'
 
+def _resolve_reporter_method(unparsed_reporter) -> tuple:
+    """(method, is_coroutine) for the reporter, memoised on the reporter instance."""
+    cached = getattr(unparsed_reporter, '_resolved_method', None)
+    if type(cached) is tuple:
+        return cached
+    method = getattr(unparsed_reporter, 'report_unparsed', None) or getattr(unparsed_reporter, 'report', None)
+    if method is None:
+        return (None, False)
+    resolved = (method, inspect.iscoroutinefunction(method))
+    try:
+        unparsed_reporter._resolved_method = resolved
+    except Exception:
+        pass
+    return resolved
+
 def _report_unparsed(unparsed_reporter: Optional['UnparsedReporter'], unparsed_raw_msg: Optional[object], **kwargs) -> None:
     """
     Call or schedule the reporter safely, and emit a standardized UNPARSED log.
@@ -407,11 +514,7 @@ def _report_unparsed(unparsed_reporter: Optional['UnparsedReporter'], unparsed_r
               source_msg_id=kwargs.get('source_msg_id', getattr(unparsed_raw_msg, 'id', None)),
               reason=kwargs.get('reason'))
 
-    method = None
-    if hasattr(unparsed_reporter, 'report_unparsed'):
-        method = getattr(unparsed_reporter, 'report_unparsed')
-    elif hasattr(unparsed_reporter, 'report'):
-        method = getattr(unparsed_reporter, 'report')
+    method, is_coro = _resolve_reporter_method(unparsed_reporter)
     if method is None:
         return
 
@@ -440,7 +543,7 @@ def _report_unparsed(unparsed_reporter: Optional['UnparsedReporter'], unparsed_r
         return loop
 
     try:
-        if inspect.iscoroutinefunction(method):
+        if is_coro:
             try:
                 loop = asyncio.get_running_loop()
                 loop.create_task(method(unparsed_raw_msg, **kwargs))
@@ -452,38 +555,18 @@ def _report_unparsed(unparsed_reporter: Optional['UnparsedReporter'], unparsed_r
     except Exception:
         # Swallow to avoid breaking the main flow
         pass
-    method = None
-    if hasattr(unparsed_reporter, 'report_unparsed'):
-        method = getattr(unparsed_reporter, 'report_unparsed')
-    elif hasattr(unparsed_reporter, 'report'):
-        method = getattr(unparsed_reporter, 'report')
-    if method is None:
-        return
-    try:
-        if inspect.iscoroutinefunction(method):
-            try:
-                loop = asyncio.get_running_loop()
-                loop.create_task(method(unparsed_raw_msg, **kwargs))
-            except RuntimeError:
-                asyncio.run(method(unparsed_raw_msg, **kwargs))
-        else:
-            method(unparsed_raw_msg, **kwargs)
-    except Exception:
-        pass
 
 def _ps_to_ast(ps: ParseSignal, raw_text: str, quoted_msg_id: Optional[str]=None) -> dict:
-    entry_exists = bool(ps.entries)
-    entry_obj = None
-    if ps.entries:
-        if len(ps.entries) == 1:
-            entry_obj = {'type': 'value', 'value': ps.entries[0]}
-        elif len(ps.entries) >= 2:
-            a, b = (ps.entries[0], ps.entries[1])
-            lo, hi = (min(a, b), max(a, b))
-            entry_obj = {'type': 'band', 'min': lo, 'max': hi}
-    tps_raw = ps.tps or []
-    tps_out = ['OPEN' if v is None else v for v in tps_raw]
-    return {'side': ps.side, 'entry': {'exists': entry_exists, 'value': entry_obj.get('value') if isinstance(entry_obj, dict) else None, 'band': {'min': entry_obj.get('min'), 'max': entry_obj.get('max')} if isinstance(entry_obj, dict) and 'min' in entry_obj else None} if entry_obj else {'exists': False}, 'tps': tps_out, 'sl': ps.sl, 'symbol': ps.symbol, 'text': {'raw': raw_text, 'norm': (raw_text or '').lower()}, 'meta': {'quoted_msg_id': quoted_msg_id}}
+    entries = ps.entries
+    if not entries:
+        entry = {'exists': False}
+    elif len(entries) == 1:
+        entry = {'exists': True, 'value': entries[0], 'band': None}
+    else:
+        a, b = (entries[0], entries[1])
+        entry = {'exists': True, 'value': None, 'band': {'min': min(a, b), 'max': max(a, b)}}
+    tps_out = [v if v is not None else 'OPEN' for v in ps.tps or []]
+    return {'side': ps.side, 'entry': entry, 'tps': tps_out, 'sl': ps.sl, 'symbol': ps.symbol, 'text': {'raw': raw_text, 'norm': (raw_text or '').lower()}, 'meta': {'quoted_msg_id': quoted_msg_id}}
 
 def semantic_route(ps: ParseSignal, text: str, reply_to_msg_id: Optional[str]):
     """Build AST and evaluate against YAML rules. Returns a small route object."""
@@ -503,6 +586,22 @@ def semantic_route(ps: ParseSignal, text: str, reply_to_msg_id: Optional[str]):
     return {'kind': kind, 'intent': str(intent) if intent else None, 'rule_id': rule_id, 'ast': ast, 'ps': ps}
 
 
+def _entry_points(worst_price: float, better_price: float, side: Optional[str]) -> list[float]:
+    """4 equidistant entry prices from worst to best, rounded to 2 decimals."""
+    step = abs(better_price - worst_price) / 3  # 3 steps between 4 points
+    if side == 'BUY':
+        # BUY: worst (high) to best (low)
+        sign = -1
+    elif side == 'SELL':
+        # SELL: worst (low) to best (high)
+        sign = 1
+    else:
+        # Fallback if no side (shouldn't happen in practice): ascending order as default
+        sign = 1 if worst_price < better_price else -1
+    if sign > 0:
+        return [round(worst_price + (i * step), 2) for i in range(4)]
+    return [round(worst_price - (i * step), 2) for i in range(4)]
+
 def plan_legs(ps: ParseSignal, legs_count: int) -> tuple[list[Optional[float]], list[Optional[float]], int]:
     """Plan per-leg entries and TPs in one place. Returns (entries, tps, effective_legs).
     
@@ -531,59 +630,33 @@ def plan_legs(ps: ParseSignal, legs_count: int) -> tuple[list[Optional[float]],
                 raise ValueError(f"Invalid SELL range: {worst_price}/{better_price} - first price must be lower than second")
         # Note: If no side specified yet (shouldn't happen), we skip validation
         
-        # Calculate 4 equidistant entry points
-        price_range = abs(better_price - worst_price)
-        step = price_range / 3  # 3 steps between 4 points
-        
-        # Generate entry points (worst to best order)
-        entry_points = []
-        for i in range(4):
-            if ps.side == 'BUY':
-                # BUY: worst (high) to best (low)
-                price = worst_price - (i * step)
-            elif ps.side == 'SELL':
-                # SELL: worst (low) to best (high)
-                price = worst_price + (i * step)
-            else:
-                # Fallback if no side (shouldn't happen in practice)
-                # Use ascending order as default
-                if worst_price < better_price:
-                    price = worst_price + (i * step)
-                else:
-                    price = worst_price - (i * step)
-            
-            # Round to 2 decimal places
-            entry_points.append(round(price, 2))
-        
         # Create 16 legs: 4 per entry point (worst to best)
         effective = 16
-        entries = []
-        for i in range(16):
-            entries.append(entry_points[i // 4])
-            
+        entries = [p for p in _entry_points(worst_price, better_price, ps.side) for _ in range(4)]
+
     else:
         # No entries specified - use default leg count
         effective = legs_count
         entries = [None] * effective
 
     # TPs distribution
-    has_open = any((t is None for t in (ps.tps or [])))
-    symbol_for_pips = (ps.symbol or DEFAULT_SYMBOL)
+    numeric, has_open = ps.tp_profile()
+    symbol_for_pips = (ps.symbol or CFG.default_symbol)
     
     # For 16 legs with distinct entries, repeat the 4-TP block pattern
     if effective == 16 and entries and (entries[0] is not None):
-        blk = _tp_block_from_list(ps.tps or [], has_open)
+        blk = _tp_block_from_list(numeric, has_open)
         # Repeat the block 4 times for 16 legs
         tp_list = (blk * 4)[:effective]
         
     # For 8 legs - this shouldn't happen anymore with new logic, but keep for safety
     elif effective == 8 and entries and (entries[0] is not None) and (len(entries) > 4) and (entries[4] is not None) and (not _is_same_price(entries[0], entries[4], symbol_for_pips)):
-        blk = _tp_block_from_list(ps.tps or [], has_open)
+        blk = _tp_block_from_list(numeric, has_open)
         tp_list = (blk * ((effective + 3)//4))[:effective]
         
     # For 4 legs (single price)
     elif effective == 4:
-        tp_list = _tp_block_from_list(ps.tps or [], has_open)
+        tp_list = _tp_block_from_list(numeric, has_open)
         
     # Fallback for other cases
     else:
@@ -591,27 +664,30 @@ def plan_legs(ps: ParseSignal, legs_count: int) -> tuple[list[Optional[float]],
     
     return entries, tp_list, effective
 
-def build_open_action(ps: ParseSignal, source_msg_id: str, legs_count: int, leg_volume: float) -> Action:
+_LEG_LIST_ADAPTER = TypeAdapter(List[Leg])
+
+def build_open_action(ps: ParseSignal, source_msg_id: str, legs_count: int, leg_volume: float) -> Optional[Action]:
+    """Build the OPEN Action for a parsed signal; None when no symbol (parsed or default) is available."""
     side: Side = ps.side
-    symbol = (ps.symbol or DEFAULT_SYMBOL).upper()
+    symbol = (ps.symbol or CFG.default_symbol).upper()
+    if not symbol:
+        return None
     # Plan entries/TPs consistently
     entries, tp_list, effective_legs = plan_legs(ps, legs_count)
-    legs: List[Leg] = []
     client_id = _client_id_for_message(symbol, source_msg_id)
-    for i in range(effective_legs):
-        leg_id = _make_leg_id(client_id, i + 1)
-        entry_i = entries[i] if i < len(entries) else None
-        tp_i = tp_list[i] if i < len(tp_list) else None
-        legs.append(Leg(
-            leg_id=leg_id,
-            symbol=symbol,
-            side=side,
-            volume=float(leg_volume),
-            entry=entry_i,
-            sl=ps.sl,
-            tp=tp_i,
-            tag=leg_id
-        ))
+    # Shared fields live in one prototype dict; all legs are validated in a single adapter call
+    proto = {'symbol': symbol, 'side': side, 'volume': float(leg_volume), 'sl': ps.sl}
+    n_entries = len(entries)
+    n_tps = len(tp_list)
+    leg_prefix = client_id + '#'
+    legs: List[Leg] = _LEG_LIST_ADAPTER.validate_python([
+        {**proto,
+         'leg_id': leg_id,
+         'entry': entries[i] if i < n_entries else None,
+         'tp': tp_list[i] if i < n_tps else None,
+         'tag': leg_id}
+        for i, leg_id in enumerate([leg_prefix + str(j) for j in range(1, effective_legs + 1)])
+    ])
     action_id = _make_action_id('OPEN', source_msg_id, legs)
     return Action(action_id=action_id, type='OPEN', legs=legs, source_msg_id=str(source_msg_id))
 
@@ -619,7 +695,7 @@ def post_open_side_effects(action: Action) -> None:
     """Record open in index + optional mock ACKs (file/paper)."""
     try:
         if action.type == 'OPEN':
-            action_dict = {'action_id': action.action_id, 'type': action.type, 'source_msg_id': action.source_msg_id, 'legs': [{'tag': getattr(L, 'tag', getattr(L, 'leg_id', None)), 'leg_id': getattr(L, 'leg_id', None), 'symbol': L.symbol, 'volume': L.volume, 'entry': L.entry, 'sl': L.sl, 'tp': L.tp} for L in action.legs]}
+            action_dict = {'action_id': action.action_id, 'type': action.type, 'source_msg_id': action.source_msg_id, 'legs': [{'tag': L.tag, 'leg_id': L.leg_id, 'symbol': L.symbol, 'volume': L.volume, 'entry': L.entry, 'sl': L.sl, 'tp': L.tp} for L in action.legs]}
             record_open(action_dict)
             if os.getenv('ROUTER_BACKEND', 'file') == 'file' and os.getenv('ROUTER_MODE', 'paper') == 'paper':
                 generate_mock_ack_for_open(action_dict)
@@ -630,27 +706,30 @@ def build_modify_action_from_gk(gk: str, ps: ParseSignal, source_msg_id: str, mg
     legs_meta = list_open_legs(gk) or []
     if not legs_meta:
         return None
-    base_symbol = legs_meta[0].get('symbol') if legs_meta and legs_meta[0].get('symbol') else ps.symbol or DEFAULT_SYMBOL
+    base_symbol = legs_meta[0].get('symbol') if legs_meta and legs_meta[0].get('symbol') else ps.symbol or CFG.default_symbol
+    if not base_symbol:
+        return None
     client_id = _client_id_for_message(str(base_symbol).upper(), source_msg_id)
+    # For break-even / risk-free, target SL to entry; otherwise keep existing SL
+    sl_to_entry = mgmt_intent in ('MGMT_BREAK_EVEN', 'MGMT_RISK_FREE')
+    # Side is not used by MT5 for MODIFY, but Pydantic requires it; default safely to 'BUY'
+    default_side = ps.side or 'BUY'
+    leg_cls = Leg
     legs: List[Leg] = []
     for i, meta in enumerate(legs_meta, start=1):
-        leg_id = _make_leg_id(client_id, i)
-        base_entry = meta.get('entry')
-        # For break-even / risk-free, target SL to entry; otherwise keep existing SL
-        target_sl = base_entry if mgmt_intent in ('MGMT_BREAK_EVEN', 'MGMT_RISK_FREE') else meta.get('sl')
-        # Side is not used by MT5 for MODIFY, but Pydantic requires it; default safely to 'BUY'
-        leg_side = meta.get('side') or ps.side or 'BUY'
-        legs.append(Leg(
-            leg_id=leg_id,
-            symbol=meta.get('symbol') or base_symbol,
-            side=leg_side,
-            volume=float(meta.get('volume') or DEFAULT_LEG_VOLUME),
+        get = meta.get
+        base_entry = get('entry')
+        legs.append(leg_cls(
+            leg_id=f'{client_id}#{i}',
+            symbol=get('symbol') or base_symbol,
+            side=get('side') or default_side,
+            volume=float(get('volume') or CFG.default_leg_volume),
             entry=base_entry,
-            sl=target_sl,
-            tp=meta.get('tp'),
-            tag=meta.get('leg_tag') or meta.get('tag'),
-            position_ticket=meta.get('position_ticket'),
-            order_ticket=meta.get('order_ticket'),
+            sl=base_entry if sl_to_entry else get('sl'),
+            tp=get('tp'),
+            tag=get('leg_tag') or get('tag'),
+            position_ticket=get('position_ticket'),
+            order_ticket=get('order_ticket'),
         ))
     legs = _coalesce_modify_legs(legs, gk)
 
@@ -715,7 +794,9 @@ def build_cancel_pending_action_from_gk(gk: str, ps: ParseSignal, source_msg_id:
         # Default: treat as pending if there's an order and no position/deal
         return True
 
-    base_symbol = (legs_meta[0].get("symbol") if legs_meta and legs_meta[0].get("symbol") else (ps.symbol or DEFAULT_SYMBOL))
+    base_symbol = (legs_meta[0].get("symbol") if legs_meta and legs_meta[0].get("symbol") else (ps.symbol or CFG.default_symbol))
+    if not base_symbol:
+        return None
     client_id = _client_id_for_message(str(base_symbol).upper(), source_msg_id)
 
     legs: List[Leg] = []
@@ -731,7 +812,7 @@ def build_cancel_pending_action_from_gk(gk: str, ps: ParseSignal, source_msg_id:
                 leg_id=leg_id,
                 symbol=meta.get("symbol") or base_symbol,
                 side=ps.side or "BUY",  # side unused by MT5 for CANCEL; keep for schema
-                volume=float(meta.get("volume") or getattr(ps, 'leg_volume', None) or DEFAULT_LEG_VOLUME),
+                volume=float(meta.get("volume") or getattr(ps, 'leg_volume', None) or CFG.default_leg_volume),
                 entry=None, sl=None, tp=None,
                 tag=str(meta.get("leg_tag") or meta.get("tag") or i),
                 position_ticket=int(pos_t) if pos_t else None,
@@ -751,115 +832,129 @@ def build_cancel_pending_action_from_gk(gk: str, ps: ParseSignal, source_msg_id:
     _log_emit('CANCEL', action=act, gk=gk, source_msg_id=source_msg_id)
     return act
 
-def build_modify_from_edit(ps: ParseSignal, source_msg_id: str, legs_count: int) -> Optional[Action]:
-    """Build MODIFY action when an OPEN message is edited, properly handling 16 legs."""
-    gk = resolve_group_key(text=ps.raw, reply_to_msg_id=str(source_msg_id))
-    log.info('OPEN_EDIT: GK=%s', gk)
-    if not gk:
-        return None
-    legs_meta = list_open_legs(gk) or []
-    if not legs_meta:
-        return None
-    
-    # Use the unified planner for consistency across OPEN and EDIT/MODIFY
+_EDIT_TP_REPEATS = {16: 4, 4: 1}
+
+@functools.lru_cache(maxsize=256)
+def _plan_edit_targets(side, entries: tuple, tps: tuple, symbol, symbol_for_pips: str, legs_count: int, default_symbol: str) -> tuple:
+    """Planned (entries, tps, size, from_meta) for an OPEN edit; default_symbol only keys the cache.
+
+    from_meta=True means the entries must come from the stored legs (entries/tps are None then).
+    """
+    ps = ParseSignal(side=side, symbol=symbol, entries=list(entries), tps=list(tps))
     planned_entries, tp_list, planned_size = plan_legs(ps, legs_count)
+    numeric, has_open = ps.tp_profile()
     
-    def _resolve_symbol_for_pips(ps_):
-        # 1) explicit single symbol parsed
-        sym = getattr(ps_, "symbol", None)
-        if sym:
-            return sym
-        # 2) first candidate in symbols list
-        syms = getattr(ps_, "symbols", None)
-        if syms and isinstance(syms, (list, tuple)) and syms:
-            return syms[0]
-        # 3) meta.symbol if present
-        meta = getattr(ps_, "meta", None)
-        if meta and getattr(meta, "symbol", None):
-            return meta.symbol
-        # 4) final fallback
-        return DEFAULT_SYMBOL
-    
-    symbol_for_pips = _resolve_symbol_for_pips(ps)
-    
-    # FIX: Handle 16 legs properly
-    if planned_size == 16 and planned_entries and (planned_entries[0] is not None):
-        # For 16 legs, repeat the TP block 4 times
-        has_open = any((t is None for t in ps.tps or []))
-        blk = _tp_block_from_list(ps.tps or [], has_open)
-        tp_list = (blk * 4)[:planned_size]  # Repeat block 4 times for 16 legs
+    blk = _tp_block_from_list(numeric, has_open)
+    # Common shapes: 16 legs = block x4 (needs planned entries), 4 legs = one block
+    has_entry = bool(planned_entries) and planned_entries[0] is not None
+    repeat = _EDIT_TP_REPEATS.get(planned_size) if (has_entry or planned_size == 4) else None
+    if repeat:
+        tp_list = (blk * repeat)[:planned_size]
         
-    elif planned_size >= 8 and planned_entries and (planned_entries[0] is not None) and \
+    elif planned_size >= 8 and has_entry and \
          len(planned_entries) > 4 and (planned_entries[4] is not None) and \
          (not _is_same_price(planned_entries[0], planned_entries[4], symbol_for_pips)):
         # Legacy 8-leg handling (shouldn't happen with new logic, but keep for safety)
-        has_open = any((t is None for t in ps.tps or []))
-        blk = _tp_block_from_list(ps.tps or [], has_open)
         tp_list = (blk * 2)[:planned_size]  # Repeat block 2 times for 8 legs
         
-    elif planned_size == 4:
-        has_open = any((t is None for t in ps.tps or []))
-        tp_list = _tp_block_from_list(ps.tps or [], has_open)
-        
-    elif len(ps.entries or []) == 1:
-        planned_entries = [ps.entries[0]] * 4
+    elif len(entries) == 1:
+        planned_entries = [entries[0]] * 4
         tp_list = _tps_for_legs(ps, 4)
         
     else:
+        # Entries come from the stored legs; the caller fills them in
+        return None, None, planned_size, True
+    return tuple(planned_entries), tuple(tp_list), planned_size, False
+
+def _symbol_for_pips(ps: ParseSignal) -> str:
+    """Symbol used for pip sizing: parsed symbol, first candidate, meta symbol, then the default."""
+    meta = ps.meta
+    return (ps.symbol
+            or (ps.symbols[0] if ps.symbols else None)
+            or (meta.symbol if meta is not None else None)
+            or CFG.default_symbol)
+
+def build_modify_from_edit(ps: ParseSignal, source_msg_id: str, legs_count: int) -> Optional[Action]:
+    """Build MODIFY action when an OPEN message is edited, properly handling 16 legs."""
+    gk = resolve_group_key(text=ps.raw, reply_to_msg_id=str(source_msg_id))
+    log.info('OPEN_EDIT: GK=%s', gk)
+    if not gk:
+        return None
+    legs_meta = list_open_legs(gk) or []
+    if not legs_meta:
+        return None
+    
+    symbol_for_pips = _symbol_for_pips(ps)
+    # Edit bursts re-deliver the same signal: the plan is memoised on the parsed fields
+    planned_entries, tp_list, planned_size, from_meta = _plan_edit_targets(
+        ps.side, tuple(ps.entries or ()), tuple(ps.tps or ()), ps.symbol, symbol_for_pips, legs_count, CFG.default_symbol)
+    if from_meta:
         planned_entries = [m.get('entry') for m in legs_meta]
         tp_list = _tps_for_legs(ps, len(planned_entries))
     
     # Build legs
-    legs: List[Leg] = []
-    meta_symbol = legs_meta[0].get('symbol') if legs_meta and legs_meta[0].get('symbol') else ps.symbol or DEFAULT_SYMBOL
+    meta_symbol = legs_meta[0].get('symbol') if legs_meta and legs_meta[0].get('symbol') else ps.symbol or CFG.default_symbol
+    # Symbols are checked up front so _validate_action does not have to walk the built legs again
+    if not all(meta.get('symbol', meta_symbol) for meta in legs_meta):
+        return None
     client_id = _client_id_for_message(str(meta_symbol), source_msg_id)
     
-    for i, meta in enumerate(legs_meta, start=1):
-        leg_id = _make_leg_id(client_id, i)
-        tag = meta.get('leg_tag') or leg_id
-        entry_i = planned_entries[i - 1] if i - 1 < len(planned_entries) else meta.get('entry')
-        new_sl = ps.sl if ps.sl is not None else meta.get('sl')
-        new_tp = tp_list[i - 1] if i - 1 < len(tp_list) else meta.get('tp')
-        
-        legs.append(Leg(
+    sl = ps.sl
+    default_side = ps.side
+    default_volume = CFG.default_leg_volume
+    n_entries = len(planned_entries)
+    n_tps = len(tp_list)
+    leg_prefix = client_id + '#'
+    leg_ids = [leg_prefix + str(i) for i in range(1, len(legs_meta) + 1)]
+    legs: List[Leg] = [
+        Leg(
             leg_id=leg_id,
             symbol=meta.get('symbol', meta_symbol),
-            side=meta.get('side', ps.side),
-            volume=float(meta.get('volume') or DEFAULT_LEG_VOLUME),
-            entry=entry_i,
-            sl=new_sl,
-            tp=new_tp,
-            tag=tag,
+            side=meta.get('side', default_side),
+            volume=float(meta.get('volume') or default_volume),
+            entry=planned_entries[i] if i < n_entries else meta.get('entry'),
+            sl=sl if sl is not None else meta.get('sl'),
+            tp=tp_list[i] if i < n_tps else meta.get('tp'),
+            tag=meta.get('leg_tag') or leg_id,
             position_ticket=meta.get('position_ticket'),
             order_ticket=meta.get('order_ticket')
-        ))
-        
-        # Log resolution for debugging
-        resolved_by = 'position_ticket' if meta.get('position_ticket') else 'order_ticket' if meta.get('order_ticket') else 'tag'
-        logging.getLogger('processing').info(
-            'MGMT_RESOLVE',
-            extra={
-                'event': 'MGMT_RESOLVE',
-                'gk': gk,
-                'tag': tag,
-                'symbol': meta.get('symbol', meta_symbol),
-                'resolved_by': resolved_by,
-                'position_ticket': meta.get('position_ticket'),
-                'order_ticket': meta.get('order_ticket')
-            }
         )
+        for i, (meta, leg_id) in enumerate(zip(legs_meta, leg_ids))
+    ]
+    
+    # Log resolution for debugging (skip building the extra dicts when INFO is off)
+    if log.isEnabledFor(logging.INFO):
+        for leg, meta in zip(legs, legs_meta):
+            resolved_by = 'position_ticket' if meta.get('position_ticket') else 'order_ticket' if meta.get('order_ticket') else 'tag'
+            log.info(
+                'MGMT_RESOLVE',
+                extra={
+                    'event': 'MGMT_RESOLVE',
+                    'gk': gk,
+                    'tag': leg.tag,
+                    'symbol': meta.get('symbol', meta_symbol),
+                    'resolved_by': resolved_by,
+                    'position_ticket': meta.get('position_ticket'),
+                    'order_ticket': meta.get('order_ticket')
+                }
+            )
     
     # Handle case where new entries are added (shouldn't happen in normal edit)
     if len(planned_entries) > len(legs_meta):
+        new_tag_prefix = f'{meta_symbol or CFG.default_symbol}#'
+        new_symbol = str(meta_symbol)
+        if not new_symbol:
+            return None
+        new_volume = float(default_volume)
         for j in range(len(legs_meta) + 1, len(planned_entries) + 1):
-            tag_new = f'{meta_symbol or DEFAULT_SYMBOL}#{j}'
+            tag_new = f'{new_tag_prefix}{j}'
             leg_new = Leg(
-                leg_id=_make_leg_id(client_id, j),
-                symbol=str(meta_symbol),
-                side=ps.side,
-                volume=float(DEFAULT_LEG_VOLUME),
+                leg_id=leg_prefix + str(j),
+                symbol=new_symbol,
+                side=default_side,
+                volume=new_volume,
                 entry=planned_entries[j - 1],
-                sl=ps.sl,
+                sl=sl,
                 tp=tp_list[j - 1] if j - 1 < len(tp_list) else None,
                 tag=tag_new
             )
@@ -871,35 +966,22 @@ def build_modify_from_edit(ps: ParseSignal, source_msg_id: str, legs_count: int)
 
 
 def _validate_action(action: 'Action') -> bool:
-    try:
-        if not action or not getattr(action, 'legs', None):
-            return False
-        for L in action.legs:
-            if not getattr(L, 'symbol', None):
-                return False
-            if getattr(L, 'volume', None) is None:
-                return False
-        return True
-    except Exception:
-        return False
+    # The builders refuse to emit a leg without a symbol, and pydantic already requires a float
+    # volume, so only the action/legs presence is left to check here
+    return bool(action and action.legs)
 
 
 # --- MGMT handler registry ------------------------------------------------
-def _handler_modify(intent: str):
-    """Factory: returns a handler that builds a MODIFY for a given MGMT intent."""
-    def _h(gk: str, ps: ParseSignal, source_msg_id: str) -> Optional[Action]:
-        return build_modify_action_from_gk(gk, ps, source_msg_id, intent)
-    return _h
-
 def handle_tp2_hit(gk: str, ps: ParseSignal, source_msg_id: str) -> Optional[Action]:
     return build_cancel_pending_action_from_gk(gk, ps, source_msg_id)
 
-MGMT_HANDLERS: dict[str, callable] = {
-    'MGMT_BREAK_EVEN': _handler_modify('MGMT_BREAK_EVEN'),
-    'MGMT_RISK_FREE':  _handler_modify('MGMT_RISK_FREE'),
-    'MGMT_TP2_HIT':    handle_tp2_hit,
-}
-def build_actions_from_message(source_msg_id: str, text: str, *, is_edit: bool=False, legs_count: int=5, leg_volume: float=DEFAULT_LEG_VOLUME, unparsed_reporter: Optional['UnparsedReporter']=None, unparsed_raw_msg: Optional[object]=None, reply_to_msg_id: Optional[str]=None, router=None) -> List[Action]:
+# Read-only intent -> builder table; partial() binds the intent without an extra Python frame
+MGMT_HANDLERS: Mapping[str, Callable[[str, ParseSignal, str], Optional[Action]]] = MappingProxyType({
+    'MGMT_BREAK_EVEN': functools.partial(build_modify_action_from_gk, mgmt_intent='MGMT_BREAK_EVEN'),
+    'MGMT_RISK_FREE':  functools.partial(build_modify_action_from_gk, mgmt_intent='MGMT_RISK_FREE'),
+    'MGMT_TP2_HIT':    build_cancel_pending_action_from_gk,
+})
+def build_actions_from_message(source_msg_id: str, text: str, *, is_edit: bool=False, legs_count: int=5, leg_volume: float=CFG.default_leg_volume, unparsed_reporter: Optional['UnparsedReporter']=None, unparsed_raw_msg: Optional[object]=None, reply_to_msg_id: Optional[str]=None, router=None) -> List[Action]:
     """Parse a Telegram message and build one Action (OPEN/MODIFY) with 1..N legs.
     
     MODIFIED TO HANDLE GOING RISK FREE MESSAGES
@@ -920,7 +1002,7 @@ def build_actions_from_message(source_msg_id: str, text: str, *, is_edit: bool=F
     if _maybe_ack_ignore(source_msg_id, text, unparsed_raw_msg):
         return []
     _log_rules_state_once()
-    legs_count = max(1, min(int(legs_count), MAX_LEGS))
+    legs_count = max(1, min(int(legs_count), CFG.max_legs))
     route = semantic_route(ps, text, reply_to_msg_id)
 
     # Validate range early for dual-price entries
@@ -941,26 +1023,17 @@ def build_actions_from_message(source_msg_id: str, text: str, *, is_edit: bool=F
         
         if is_invalid_range:
             log.warning("INVALID_RANGE: %s", error_msg)
-            if ENGINE_FAILSAFE_ON_UNPARSED:
+            if CFG.failsafe_on_unparsed:
                 _report_unparsed(
                     unparsed_reporter, 
                     unparsed_raw_msg, 
                     reason='INVALID_RANGE', 
                     source_msg_id=source_msg_id, 
-                    symbol_guess=ps.symbol or DEFAULT_SYMBOL, 
+                    symbol_guess=ps.symbol or CFG.default_symbol, 
                     side_guess=ps.side
                 )
             return []
 
-    if route['kind'] != 'MGMT':
-        has_side = bool(_SIDE_RE.search(text or ''))
-        has_at = '@' in (text or '')
-        missing_entries = not ps.entries
-        if SIGNAL_REQUIRE_PRICE and (missing_entries or (has_side and (not has_at))):
-            reason = 'MISSING_AT' if has_side and (not has_at) else 'NO_PRICE'
-            if ENGINE_FAILSAFE_ON_UNPARSED:
-                _report_unparsed(unparsed_reporter, unparsed_raw_msg, reason=reason, source_msg_id=source_msg_id, symbol_guess=ps.symbol or DEFAULT_SYMBOL, side_guess=ps.side)
-            return []
     if route['kind'] == 'MGMT' and route['intent']:
         try:
             _reply_nested = getattr(unparsed_raw_msg, 'reply_to_msg_id', None)
@@ -989,6 +1062,15 @@ def build_actions_from_message(source_msg_id: str, text: str, *, is_edit: bool=F
                     pass
             return [act]
         return []
+    if route['kind'] != 'MGMT' and CFG.require_price:
+        # MGMT routes were handled above; '@' is a cheap substring test, so the
+        # side regex only runs when the '@' is actually missing
+        missing_at = '@' not in text and _SIDE_RE.search(text) is not None
+        if missing_at or not ps.entries:
+            reason = 'MISSING_AT' if missing_at else 'NO_PRICE'
+            if CFG.failsafe_on_unparsed:
+                _report_unparsed(unparsed_reporter, unparsed_raw_msg, reason=reason, source_msg_id=source_msg_id, symbol_guess=ps.symbol or CFG.default_symbol, side_guess=ps.side)
+            return []
     if is_edit:
         act = build_modify_from_edit(ps, source_msg_id, legs_count)
         if act and _validate_action(act):
@@ -1009,8 +1091,8 @@ def build_actions_from_message(source_msg_id: str, text: str, *, is_edit: bool=F
         if is_edit and ps.side is not None:
             pass
         else:
-            if ENGINE_FAILSAFE_ON_UNPARSED:
-                _report_unparsed(unparsed_reporter, unparsed_raw_msg, reason=_reason_for_unparsed(ps, text), symbol_guess=ps.symbol or DEFAULT_SYMBOL, side_guess=ps.side)
+            if CFG.failsafe_on_unparsed:
+                _report_unparsed(unparsed_reporter, unparsed_raw_msg, reason=_reason_for_unparsed(ps, text), symbol_guess=ps.symbol or CFG.default_symbol, side_guess=ps.side)
             return []
     open_action = build_open_action(ps, source_msg_id, legs_count, leg_volume)
     if not _validate_action(open_action):
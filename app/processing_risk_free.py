@@ -8,6 +8,7 @@ Supports two modes:
 2. INDIVIDUAL_ENTRY: Each position gets SL at its own entry + offset
 """
 
+import functools
 import logging
 import os
 import re
@@ -23,6 +24,21 @@ else:
 
 log = logging.getLogger("processing.risk_free")
 
+_GK_OPEN_PREFIX = "OPEN_"
+_GK_OPEN_RE = re.compile(r'OPEN_(\d+)')
+_ORDER_COMMENT_RE = re.compile(r'^(\d+)[_#](\d+)(?::.*)?')
+
+
+def _msg_id_from_group_key(group_key: str) -> Optional[str]:
+    """Message id from an "OPEN_<msgid>" group key (leading digits after the prefix), or None."""
+    if group_key.startswith(_GK_OPEN_PREFIX):
+        rest = group_key[len(_GK_OPEN_PREFIX):]
+        if rest.isdecimal():
+            return rest
+    match = _GK_OPEN_RE.match(group_key)
+    return match.group(1) if match else None
+
+
 def delete_pending_orders_for_group(group_key: str, router, source_msg_id: str) -> List[dict]:
     """
     Delete all pending orders for a group when going risk-free.
@@ -35,15 +51,12 @@ def delete_pending_orders_for_group(group_key: str, router, source_msg_id: str)
     Returns:
         List of deletion results
     """
-    import re
-    
     # Extract message ID from group key
-    match = re.match(r'OPEN_(\d+)', group_key)
-    if not match:
-        log.error(f"Cannot extract message ID from group_key: {group_key}")
+    target_msg_id = _msg_id_from_group_key(group_key)
+    if target_msg_id is None:
+        log.error("Cannot extract message ID from group_key: %s", group_key)
         return []
     
-    target_msg_id = match.group(1)
     deletion_results = []
     
     if not router or not hasattr(router, 'mt5'):
@@ -58,13 +71,16 @@ def delete_pending_orders_for_group(group_key: str, router, source_msg_id: str)
             return []
         
         orders_to_delete = []
+        prefixes = (target_msg_id + '_', target_msg_id + '#')
         
         # Find orders matching this message ID
         for order in orders:
             comment = getattr(order, 'comment', '')
+            if not comment.startswith(prefixes):
+                continue
             
             # Parse comment: "msgid_legindex:symbol" or "msgid#legindex:symbol"
-            comment_match = re.match(r'^(\d+)[_#](\d+)(?::.*)?', comment)
+            comment_match = _ORDER_COMMENT_RE.match(comment)
             
             if comment_match:
                 msg_id = comment_match.group(1)
@@ -77,8 +93,8 @@ def delete_pending_orders_for_group(group_key: str, router, source_msg_id: str)
                         'comment': comment,
                         'leg': leg_idx
                     })
-                    log.info(f"Found pending order to delete: ticket={order.ticket} "
-                           f"leg={leg_idx} symbol={order.symbol}")
+                    log.info("Found pending order to delete: ticket=%s leg=%s symbol=%s",
+                             order.ticket, leg_idx, order.symbol)
         
         # Delete each order
         for order_info in orders_to_delete:
@@ -99,8 +115,8 @@ def delete_pending_orders_for_group(group_key: str, router, source_msg_id: str)
                         'success': True,
                         'leg': order_info['leg']
                     })
-                    log.info(f"Successfully deleted order {order_info['ticket']} "
-                           f"(leg {order_info['leg']})")
+                    log.info("Successfully deleted order %s (leg %s)",
+                             order_info['ticket'], order_info['leg'])
                 else:
                     error_msg = result.comment if result else "Unknown error"
                     deletion_results.append({
@@ -109,7 +125,7 @@ def delete_pending_orders_for_group(group_key: str, router, source_msg_id: str)
                         'error': error_msg,
                         'leg': order_info['leg']
                     })
-                    log.error(f"Failed to delete order {order_info['ticket']}: {error_msg}")
+                    log.error("Failed to delete order %s: %s", order_info['ticket'], error_msg)
                     
             except Exception as e:
                 deletion_results.append({
@@ -118,65 +134,132 @@ def delete_pending_orders_for_group(group_key: str, router, source_msg_id: str)
                     'error': str(e),
                     'leg': order_info['leg']
                 })
-                log.error(f"Exception deleting order {order_info['ticket']}: {e}")
+                log.error("Exception deleting order %s: %s", order_info['ticket'], e)
         
         # Summary logging
         if deletion_results:
             success_count = sum(1 for r in deletion_results if r['success'])
             fail_count = sum(1 for r in deletion_results if not r['success'])
-            log.info(f"Order deletion complete for msg={target_msg_id}: "
-                   f"{success_count} succeeded, {fail_count} failed")
+            log.info("Order deletion complete for msg=%s: %s succeeded, %s failed",
+                     target_msg_id, success_count, fail_count)
         else:
-            log.info(f"No pending orders found for msg={target_msg_id}")
+            log.info("No pending orders found for msg=%s", target_msg_id)
             
     except Exception as e:
-        log.error(f"Error in delete_pending_orders_for_group: {e}", exc_info=True)
+        log.error("Error in delete_pending_orders_for_group: %s", e, exc_info=True)
     
     return deletion_results
 
+_CLEAN_SYMBOL_RE = re.compile(r'[^A-Z0-9]')
+
+_PIP_DEFAULTS = {
+    'XAUUSD': 10.0,
+    'GOLD': 10.0,
+    'BTCUSD': 1.0,
+    'EURUSD': 10000.0,
+    'GBPUSD': 10000.0,
+    'USDJPY': 100.0,
+}
+
+_PIP_ENV_OVERRIDES: Optional[Dict[str, float]] = None
+
+
+def _pip_env_overrides() -> Dict[str, float]:
+    """PIP_MULT_<SYMBOL> overrides, read from the environment on first use (after .env is loaded)."""
+    global _PIP_ENV_OVERRIDES
+    if _PIP_ENV_OVERRIDES is None:
+        overrides = {}
+        for key, value in os.environ.items():
+            if key.startswith('PIP_MULT_'):
+                try:
+                    overrides[key[len('PIP_MULT_'):]] = float(value)
+                except ValueError:
+                    pass
+        _PIP_ENV_OVERRIDES = overrides
+    return _PIP_ENV_OVERRIDES
+
+
+@functools.lru_cache(maxsize=128)
+def _pip_multiplier_for(clean_symbol: str) -> float:
+    result = _pip_env_overrides().get(clean_symbol)
+    if result is None:
+        result = _PIP_DEFAULTS.get(clean_symbol, 10000.0)
+    log.debug("Pip multiplier for %s: %s", clean_symbol, result)
+    return result
+
+
+_RISK_FREE_MODE: Optional[str] = None
+_RISK_FREE_BE_OFFSET: Optional[float] = None
+
+
+def _risk_free_mode() -> str:
+    """RISK_FREE_MODE, read once on first use."""
+    global _RISK_FREE_MODE
+    if _RISK_FREE_MODE is None:
+        _RISK_FREE_MODE = os.getenv("RISK_FREE_MODE", "WEIGHTED_AVERAGE").upper()
+    return _RISK_FREE_MODE
+
+
+def _risk_free_be_offset() -> float:
+    """RISK_FREE_BE_OFFSET in pips, read once on first use."""
+    global _RISK_FREE_BE_OFFSET
+    if _RISK_FREE_BE_OFFSET is None:
+        _RISK_FREE_BE_OFFSET = float(os.getenv("RISK_FREE_BE_OFFSET", "1.0"))
+    return _RISK_FREE_BE_OFFSET
+
+
+def reset_risk_free_env() -> None:
+    """Forget env-derived settings (mode, BE offset, pip overrides) so the next call re-reads them."""
+    global _PIP_ENV_OVERRIDES, _RISK_FREE_MODE, _RISK_FREE_BE_OFFSET
+    _PIP_ENV_OVERRIDES = None
+    _RISK_FREE_MODE = None
+    _RISK_FREE_BE_OFFSET = None
+    _pip_multiplier_for.cache_clear()
+
+
 def get_pip_multiplier(symbol: str) -> float:
     """Get pip multiplier for a symbol."""
-    clean_symbol = re.sub(r'[^A-Z0-9]', '', symbol.upper())
-    
-    env_key = f"PIP_MULT_{clean_symbol}"
-    if env_key in os.environ:
-        try:
-            return float(os.environ[env_key])
-        except ValueError:
-            pass
-    
-    defaults = {
-        'XAUUSD': 10.0,
-        'GOLD': 10.0,
-        'BTCUSD': 1.0,
-        'EURUSD': 10000.0,
-        'GBPUSD': 10000.0,
-        'USDJPY': 100.0,
-    }
-    
-    result = defaults.get(clean_symbol, 10000.0)
-    log.debug(f"Pip multiplier for {clean_symbol}: {result}")
-    return result
+    return _pip_multiplier_for(_CLEAN_SYMBOL_RE.sub('', symbol.upper()))
+
+
+def _breakeven_sl(is_buy: bool, entry_price: float, pip_value: float) -> float:
+    """Pure SL kernel: entry moved pip_value in the position's favour."""
+    return entry_price + pip_value if is_buy else entry_price - pip_value
 
 
 def calculate_breakeven_price(symbol: str, side: str, entry_price: float, 
                              pip_offset: float = 1.0) -> float:
     """Calculate breakeven + offset price for a position."""
-    pip_mult = get_pip_multiplier(symbol)
-    pip_value = pip_offset / pip_mult
-    
-    if side == "BUY":
-        new_sl = entry_price + pip_value
-    else:
-        new_sl = entry_price - pip_value
+    pip_value = pip_offset / get_pip_multiplier(symbol)
+    new_sl = _breakeven_sl(side == "BUY", entry_price, pip_value)
     
-    log.info(f"Calculated SL: symbol={symbol} side={side} entry={entry_price:.5f} "
-             f"offset={pip_offset} pips, pip_value={pip_value:.5f}, "
-             f"new_sl={new_sl:.5f}")
+    log.info("Calculated SL: symbol=%s side=%s entry=%.5f offset=%s pips, pip_value=%.5f, new_sl=%.5f",
+             symbol, side, entry_price, pip_offset, pip_value, new_sl)
     
     return new_sl
 
 
+_LEG_NUM_RE = re.compile(r'\d+')
+
+
+def _parse_position_comment(comment: str) -> Optional[Tuple[str, str]]:
+    """Split a position comment "msgid_legindex:symbol" into (msgid, legindex), or None.
+
+    Same acceptance as ``^(\\d+)_(\\d+):(.+)$`` without running the regex per position.
+    """
+    head, sep, tail = comment.partition(':')
+    if not sep:
+        return None
+    msg_id, sep, leg_idx = head.partition('_')
+    if not (sep and msg_id.isdecimal() and leg_idx.isdecimal()):
+        return None
+    if tail.endswith('\n'):
+        tail = tail[:-1]
+    if not tail or '\n' in tail:
+        return None
+    return msg_id, leg_idx
+
+
 def build_risk_free_action(group_key: str, ps, source_msg_id: str, router=None) -> Optional[Action]:
     """
     Build a MODIFY action to move positions to risk-free.
@@ -188,20 +271,19 @@ def build_risk_free_action(group_key: str, ps, source_msg_id: str, router=None)
     - WEIGHTED_AVERAGE (default): All positions get same SL based on weighted average
     - INDIVIDUAL_ENTRY: Each position gets SL at its own entry + offset
     """
-    log.info(f"Building risk-free action for {group_key}")
+    log.info("Building risk-free action for %s", group_key)
     
-    # Get the mode from environment variable
-    risk_free_mode = os.getenv("RISK_FREE_MODE", "WEIGHTED_AVERAGE").upper()
-    log.info(f"Using risk-free mode: {risk_free_mode}")
+    # Get the mode from environment variable (read once per process; see reset_risk_free_env)
+    risk_free_mode = _risk_free_mode()
+    log.info("Using risk-free mode: %s", risk_free_mode)
     
     # Extract message ID from group key
-    match = re.match(r'OPEN_(\d+)', group_key)
-    if not match:
-        log.error(f"Cannot extract message ID from group_key: {group_key}")
+    target_msg_id = _msg_id_from_group_key(group_key)
+    if target_msg_id is None:
+        log.error("Cannot extract message ID from group_key: %s", group_key)
         return None
     
-    target_msg_id = match.group(1)
-    log.info(f"Looking for positions from message {target_msg_id}")
+    log.info("Looking for positions from message %s", target_msg_id)
     
     # STEP 1: Delete pending orders FIRST (before modifying positions)
     if router:
@@ -210,7 +292,7 @@ def build_risk_free_action(group_key: str, ps, source_msg_id: str, router=None)
         
         if deletion_results:
             success_count = sum(1 for r in deletion_results if r['success'])
-            log.info(f"Deleted {success_count} pending orders for risk-free")
+            log.info("Deleted %s pending orders for risk-free", success_count)
     else:
         log.warning("No router available - cannot delete pending orders")
     
@@ -222,25 +304,31 @@ def build_risk_free_action(group_key: str, ps, source_msg_id: str, router=None)
         
         try:
             positions = router.mt5.positions_get()
-            log.info(f"MT5 returned {len(positions) if positions else 0} total positions")
+            log.info("MT5 returned %s total positions", len(positions) if positions else 0)
             
             if positions:
+                prefix = target_msg_id + '_'
                 for pos in positions:
                     comment = getattr(pos, 'comment', '')
-                    log.debug(f"Position {pos.ticket}: comment='{comment}' symbol={pos.symbol} "
-                             f"type={pos.type} price_open={pos.price_open}")
+                    # Other messages' positions are dropped on a prefix compare before any parsing
+                    if not comment.startswith(prefix):
+                        continue
+                    log.debug("Position %s: comment='%s' symbol=%s type=%s price_open=%s",
+                              pos.ticket, comment, pos.symbol, pos.type, pos.price_open)
                     
                     # Parse comment: "msgid_legindex:symbol"
-                    comment_match = re.match(r'^(\d+)_(\d+):(.+)$', comment)
+                    parsed = _parse_position_comment(comment)
                     
-                    if comment_match:
-                        msg_id = comment_match.group(1)
-                        leg_idx = comment_match.group(2)
+                    if parsed:
+                        msg_id, leg_idx = parsed
                         
                         if msg_id == target_msg_id:
                             leg_tag = f"#{leg_idx}"
                             
-                            filled_positions[leg_tag] = {
+                            # Keyed by the comment's leg digits; the tag is kept for display
+                            filled_positions[leg_idx] = {
+                                'tag': leg_tag,
+                                'leg_num': leg_idx,
                                 'position_ticket': pos.ticket,
                                 'symbol': pos.symbol,
                                 'side': 'BUY' if pos.type == 0 else 'SELL',
@@ -250,11 +338,11 @@ def build_risk_free_action(group_key: str, ps, source_msg_id: str, router=None)
                                 'current_tp': pos.tp if pos.tp > 0 else None
                             }
                             
-                            log.info(f"Found position for leg {leg_tag}: ticket={pos.ticket} "
-                                   f"fill={pos.price_open:.5f}")
+                            log.info("Found position for leg %s: ticket=%s fill=%.5f",
+                                     leg_tag, pos.ticket, pos.price_open)
                             
         except Exception as e:
-            log.error(f"Error getting MT5 positions: {e}", exc_info=True)
+            log.error("Error getting MT5 positions: %s", e, exc_info=True)
     
     # Fallback to database if no MT5 positions
     if not filled_positions:
@@ -266,7 +354,10 @@ def build_risk_free_action(group_key: str, ps, source_msg_id: str, router=None)
             for meta in legs_meta:
                 if meta.get('position_ticket'):
                     leg_tag = meta.get('leg_tag') or meta.get('tag')
+                    leg_num = _LEG_NUM_RE.search(leg_tag) if isinstance(leg_tag, str) else None
                     filled_positions[leg_tag] = {
+                        'tag': leg_tag,
+                        'leg_num': leg_num.group(0) if leg_num else "1",
                         'position_ticket': meta.get('position_ticket'),
                         'symbol': meta.get('symbol'),
                         'side': meta.get('side'),
@@ -276,30 +367,31 @@ def build_risk_free_action(group_key: str, ps, source_msg_id: str, router=None)
                         'current_tp': meta.get('tp')
                     }
         except Exception as e:
-            log.error(f"Error getting database legs: {e}", exc_info=True)
+            log.error("Error getting database legs: %s", e, exc_info=True)
     
     if not filled_positions:
-        log.error(f"No positions found for {group_key}")
+        log.error("No positions found for %s", group_key)
         return None
     
-    log.info(f"Processing {len(filled_positions)} positions for risk-free")
+    log.info("Processing %s positions for risk-free", len(filled_positions))
     
     # Get BE offset from environment
-    be_offset = float(os.getenv("RISK_FREE_BE_OFFSET", "1.0"))
+    be_offset = _risk_free_be_offset()
     
     # Build MODIFY legs based on mode
     modify_legs = []
     
     if risk_free_mode == "INDIVIDUAL_ENTRY":
         # INDIVIDUAL MODE: Each position gets its own SL at entry + offset
-        log.info(f"INDIVIDUAL_ENTRY mode: Setting individual SLs for each position")
+        log.info("INDIVIDUAL_ENTRY mode: Setting individual SLs for each position")
         
-        for leg_tag, pos_data in filled_positions.items():
+        for pos_data in filled_positions.values():
+            leg_tag = pos_data['tag']
             if not pos_data.get('position_ticket'):
                 continue
             
             if not pos_data.get('filled_price'):
-                log.warning(f"No fill price for {leg_tag}, skipping")
+                log.warning("No fill price for %s, skipping", leg_tag)
                 continue
             
             # Calculate individual SL for this position
@@ -320,11 +412,8 @@ def build_risk_free_action(group_key: str, ps, source_msg_id: str, router=None)
                 should_update = (current_sl == 0 or individual_sl < current_sl)
             
             if should_update:
-                leg_num = re.search(r'#?(\d+)', leg_tag)
-                leg_num_str = leg_num.group(1) if leg_num else "1"
-                
                 leg = Leg(
-                    leg_id=f"RF_{source_msg_id}#{leg_num_str}",
+                    leg_id=f"RF_{source_msg_id}#{pos_data['leg_num']}",
                     symbol=pos_data['symbol'],
                     side=pos_data['side'] or 'BUY',
                     volume=pos_data['volume'] or 0.01,
@@ -335,35 +424,38 @@ def build_risk_free_action(group_key: str, ps, source_msg_id: str, router=None)
                 )
                 modify_legs.append(leg)
                 
-                log.info(f"MODIFY (Individual): {leg_tag} ticket={pos_data['position_ticket']} "
-                       f"entry={pos_data['filled_price']:.5f} → SL={individual_sl:.5f}")
+                log.info("MODIFY (Individual): %s ticket=%s entry=%.5f → SL=%.5f",
+                         leg_tag, pos_data['position_ticket'], pos_data['filled_price'], individual_sl)
     
     else:  # WEIGHTED_AVERAGE mode (default)
-        # Calculate weighted average fill price
+        # Calculate weighted average fill price; the same sweep collects the positions to update
         total_volume = 0.0
         weighted_sum = 0.0
         symbol = None
         side = None
+        candidates = []
         
-        for leg_tag, pos_data in filled_positions.items():
-            if pos_data['filled_price'] and pos_data['volume']:
-                price = float(pos_data['filled_price'])
-                volume = float(pos_data['volume'])
-                weighted_sum += price * volume
+        for pos_data in filled_positions.values():
+            filled_price = pos_data['filled_price']
+            pos_volume = pos_data['volume']
+            if filled_price and pos_volume:
+                volume = float(pos_volume)
+                weighted_sum += float(filled_price) * volume
                 total_volume += volume
                 
                 # Get symbol and side from first position
                 if not symbol:
                     symbol = pos_data['symbol']
                     side = pos_data['side']
+            if pos_data.get('position_ticket'):
+                candidates.append((pos_data, pos_data.get('current_sl', 0) or 0))
         
         if total_volume == 0:
             log.error("No valid volumes found for weighted average")
             return None
         
         weighted_avg_price = weighted_sum / total_volume
-        log.info(f"Weighted average fill price: {weighted_avg_price:.5f} "
-                 f"(total volume: {total_volume:.2f})")
+        log.info("Weighted average fill price: %.5f (total volume: %.2f)", weighted_avg_price, total_volume)
         
         # Calculate single SL based on weighted average
         new_sl = calculate_breakeven_price(
@@ -373,16 +465,12 @@ def build_risk_free_action(group_key: str, ps, source_msg_id: str, router=None)
             pip_offset=be_offset
         )
         
-        log.info(f"Single SL for all positions: {new_sl:.5f} "
-                 f"(weighted avg {weighted_avg_price:.5f} + {be_offset} pips)")
+        log.info("Single SL for all positions: %.5f (weighted avg %.5f + %s pips)",
+                 new_sl, weighted_avg_price, be_offset)
         
         # Apply same SL to all positions
-        for leg_tag, pos_data in filled_positions.items():
-            if not pos_data.get('position_ticket'):
-                continue
-                
-            current_sl = pos_data.get('current_sl', 0) or 0
-            
+        for pos_data, current_sl in candidates:
+            leg_tag = pos_data['tag']
             # Check if update needed
             should_update = False
             if side == 'BUY':
@@ -391,11 +479,8 @@ def build_risk_free_action(group_key: str, ps, source_msg_id: str, router=None)
                 should_update = (current_sl == 0 or new_sl < current_sl)
             
             if should_update:
-                leg_num = re.search(r'#?(\d+)', leg_tag)
-                leg_num_str = leg_num.group(1) if leg_num else "1"
-                
                 leg = Leg(
-                    leg_id=f"RF_{source_msg_id}#{leg_num_str}",
+                    leg_id=f"RF_{source_msg_id}#{pos_data['leg_num']}",
                     symbol=pos_data['symbol'],
                     side=pos_data['side'] or 'BUY',
                     volume=pos_data['volume'] or 0.01,
@@ -406,14 +491,14 @@ def build_risk_free_action(group_key: str, ps, source_msg_id: str, router=None)
                 )
                 modify_legs.append(leg)
                 
-                log.info(f"MODIFY (Weighted): {leg_tag} ticket={pos_data['position_ticket']} "
-                       f"SL={new_sl:.5f} (from weighted avg)")
+                log.info("MODIFY (Weighted): %s ticket=%s SL=%.5f (from weighted avg)",
+                         leg_tag, pos_data['position_ticket'], new_sl)
     
     if not modify_legs:
-        log.warning(f"No positions need SL update")
+        log.warning("No positions need SL update")
         return None
     
-    log.info(f"Creating MODIFY action with {len(modify_legs)} legs using {risk_free_mode} mode")
+    log.info("Creating MODIFY action with %s legs using %s mode", len(modify_legs), risk_free_mode)
     
     # Create the MODIFY action
     action = Action(
@@ -442,7 +527,7 @@ def process_risk_free_message(text: str, ps, source_msg_id: str, router=None, re
         router: MT5 router (required for getting actual fill prices)
         reply_to_msg_id: The message ID this is replying to (REQUIRED - this is the trade to go risk-free)
     """
-    log.info(f"Processing RISK FREE message (reply_to={reply_to_msg_id})")
+    log.info("Processing RISK FREE message (reply_to=%s)", reply_to_msg_id)
     
     # ONLY use the replied-to message ID
     if not reply_to_msg_id:
@@ -450,7 +535,7 @@ def process_risk_free_message(text: str, ps, source_msg_id: str, router=None, re
         return None
     
     group_key = f"OPEN_{reply_to_msg_id}"
-    log.info(f"Using replied-to message for group key: {group_key}")
+    log.info("Using replied-to message for group key: %s", group_key)
     
     if not router:
         log.warning("No router provided - will try to get fill prices from database")
@@ -459,11 +544,11 @@ def process_risk_free_message(text: str, ps, source_msg_id: str, router=None, re
     action = build_risk_free_action(group_key, ps, source_msg_id, router)
     
     if action:
-        mode = os.getenv("RISK_FREE_MODE", "WEIGHTED_AVERAGE").upper()
-        log.info(f"Created RISK FREE action with {len(action.legs)} legs using {mode} mode")
+        mode = _risk_free_mode()
+        log.info("Created RISK FREE action with %s legs using %s mode", len(action.legs), mode)
         for leg in action.legs:
-            log.info(f"  Leg: {leg.tag} sl={leg.sl:.5f}")
+            log.info("  Leg: %s sl=%.5f", leg.tag, leg.sl)
     else:
-        log.error(f"Failed to create RISK FREE action for {group_key}")
+        log.error("Failed to create RISK FREE action for %s", group_key)
     
     return action
\ No newline at end of file
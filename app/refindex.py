@@ -1,27 +1,89 @@
 import os
 import sqlite3
+import threading
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional
 import hashlib
 import csv
 import re
+from itertools import repeat
+
+from app.common.database import get_db_manager
 
-DB_PATH = Path(os.getenv("APP_DB_PATH", "runtime/data/app.db"))
 ACKS_DIR = Path(os.getenv("ACKS_DIR", "runtime/actions/acks"))
 
-_COMMENT_RE = re.compile(r'^(?P<msg>\d+)_(?P<idx>\d+):(?P<sym>[A-Z0-9+]+)$')
+# "<msg>_<idx>:<SYMBOL>"; only the leg index is captured
+_COMMENT_RE = re.compile(r'^\d+_(\d+):[A-Z0-9+]+$')
+
+# Explicit group-key marker in management text, e.g. "[GK:OPEN_123]"
+_GK_MARK_RE = re.compile(r"\[GK:(OPEN_[^\]]+)\]")
+
+# Statements run on every OPEN/MODIFY, kept as constants
+_SQL_INSERT_SIGNAL = "INSERT OR IGNORE INTO signals(source_msg_id, chat_id, msg_ts, group_key) VALUES (?,?,?,?)"
+_SQL_INSERT_LEG = """
+    INSERT OR IGNORE INTO legs_index(group_key, leg_tag, leg_idx, symbol, volume, entry, sl, tp, ticket, status)
+    VALUES (?,?,?,?,?,?,?,?,?,?)
+"""
+_SQL_APPLY_TICKETS = """
+    UPDATE legs_index
+       SET order_ticket = COALESCE(?, order_ticket),
+           position_ticket = COALESCE(?, position_ticket)
+     WHERE group_key = ?
+       AND leg_idx = ?
+"""
+_SQL_MOCK_ACK = """
+    UPDATE legs_index
+       SET ticket=?, status='OPEN'
+     WHERE group_key=? AND leg_tag=?
+"""
+_SQL_LIST_LEGS = """
+    SELECT leg_tag,
+           symbol,
+           volume,
+           entry,
+           sl,
+           tp,
+           ticket,
+           order_ticket,
+           position_ticket,
+           status
+      FROM legs_index
+     WHERE group_key=?
+     ORDER BY rowid
+"""
+_SQL_SET_SL = "UPDATE legs_index SET sl=? WHERE group_key=? AND leg_tag=?"
+_SQL_SET_TP = "UPDATE legs_index SET tp=? WHERE group_key=? AND leg_tag=?"
 
 def get_connection():
+    """Standalone connection for callers that manage (and commit) it themselves."""
     _ensure_db()
-    return sqlite3.connect(DB_PATH)
+    return sqlite3.connect(get_db_manager().db_path)
+
+@contextmanager
+def _transaction() -> Iterator[sqlite3.Connection]:
+    """Pooled connection with one explicit transaction around the block.
 
-def _to_result_dict(exec_result: Any) -> dict:
-    # Pydantic v2: model_dump; v1: dict()
-    if hasattr(exec_result, "model_dump"):
-        return exec_result.model_dump()
-    if hasattr(exec_result, "dict"):
-        return exec_result.dict()
-    return dict(exec_result or {}) if isinstance(exec_result, dict) else {}
+    The shared pool keeps its connections (and their page caches) open across
+    calls but runs them in autocommit mode, so batches are wrapped here.
+    """
+    with get_db_manager().get_connection() as con:
+        con.execute("BEGIN")
+        try:
+            yield con
+            con.execute("COMMIT")
+        finally:
+            # Block or COMMIT failed: never hand the pooled connection back mid-transaction
+            if con.in_transaction:
+                con.execute("ROLLBACK")
+
+def _result_details(exec_result: Any) -> dict:
+    """The ``details`` dict of a RouterResult (or plain dict), read without dumping the model."""
+    if isinstance(exec_result, dict):
+        details = exec_result.get("details")
+    else:
+        details = getattr(exec_result, "details", None)
+    return details if isinstance(details, dict) else {}
 
 
 def apply_open_result(conn, action, exec_result):
@@ -29,35 +91,34 @@ def apply_open_result(conn, action, exec_result):
     Persist order/position tickets returned by the router into legs_index.
     Matches rows by (group_key = OPEN_<source_msg_id>) and leg index parsed from request.comment.
     """
-    data = _to_result_dict(exec_result)
-    results = (data.get("details") or {}).get("results") or []
+    results = _result_details(exec_result).get("results") or []
     if not results:
         return
 
     gk = f"OPEN_{action.source_msg_id}"
-    cur = conn.cursor()
-
+    updates = []
+    match_comment = _COMMENT_RE.match
     for item in results:
         d = (item or {}).get("result", {}).get("details", {})
         req = d.get("request", {}) or {}
         comment = req.get("comment") or d.get("request_comment") or ""
-        m = _COMMENT_RE.match(comment)
+        m = match_comment(comment)
         if not m:
             continue
-        idx = int(m.group("idx"))
+        idx = int(m.group(1))
         order_ticket = d.get("order")
         # Optional: if you have a way to compute live position ticket now, put it here.
         position_ticket = d.get("position")  # provided by router for market deals; else None
+        if order_ticket is None and position_ticket is None:
+            continue  # COALESCE would leave the row unchanged
 
-        # Update the row for this leg
-        # We match by group_key and leg_tag suffix '#<idx>' to avoid symbol formatting issues
-        cur.execute("""
-            UPDATE legs_index
-               SET order_ticket = COALESCE(?, order_ticket),
-                   position_ticket = COALESCE(?, position_ticket)
-             WHERE group_key = ?
-               AND leg_tag LIKE ?
-        """, (order_ticket, position_ticket, gk, f"%#{idx}"))
+        updates.append((order_ticket, position_ticket, gk, idx))
+
+    if not updates:
+        return
+    # One executemany over the prepared UPDATE; each row is a (group_key, leg_idx) index lookup
+    # We match by group_key and the leg number from the tag suffix '#<idx>' to avoid symbol formatting issues
+    conn.executemany(_SQL_APPLY_TICKETS, updates)
     conn.commit()
 
 
@@ -75,9 +136,24 @@ def ensure_ticket_columns(conn):
     conn.commit()
 
 
+# Database path whose schema has been checked in this process; guarded so concurrent
+# first calls do not race on the ALTERs
+_SCHEMA_READY_FOR: Optional[str] = None
+_SCHEMA_LOCK = threading.Lock()
+
 def _ensure_db():
-    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-    with sqlite3.connect(DB_PATH) as con:
+    global _SCHEMA_READY_FOR
+    db_path = get_db_manager().db_path
+    if _SCHEMA_READY_FOR == db_path:
+        return
+    with _SCHEMA_LOCK:
+        if _SCHEMA_READY_FOR == db_path:
+            return
+        _create_schema()
+        _SCHEMA_READY_FOR = db_path
+
+def _create_schema():
+    with _transaction() as con:
         cur = con.cursor()
         cur.execute("""
             CREATE TABLE IF NOT EXISTS signals(
@@ -104,30 +180,63 @@ def _ensure_db():
         except Exception: pass
         try: cur.execute("ALTER TABLE legs_index ADD COLUMN tp REAL")
         except Exception: pass
-        con.commit()
+        # Leg number from the '#<n>' tag suffix, so results can be matched by point lookup
+        try:
+            cur.execute("ALTER TABLE legs_index ADD COLUMN leg_idx INTEGER")
+        except Exception:
+            pass
+        else:
+            # Existing rows predate the column: backfill once
+            rows = cur.execute("SELECT rowid, leg_tag FROM legs_index WHERE leg_tag LIKE '%#%'").fetchall()
+            cur.executemany("UPDATE legs_index SET leg_idx=? WHERE rowid=?",
+                            [(_leg_idx_from_tag(tag), rowid) for rowid, tag in rows])
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_legs_gk_idx ON legs_index(group_key, leg_idx)")
 
 def _gk_for_open(action: Dict[str, Any]) -> str:
     return f"OPEN_{action.get('source_msg_id','')}"
 
+def _leg_idx_from_tag(tag: Optional[str]) -> Optional[int]:
+    """Leg number from a '<client>#<n>' tag, or None when the tag has no plain numeric suffix."""
+    if not tag:
+        return None
+    head, sep, num = tag.rpartition('#')
+    # Canonical digits only ('#05' is not leg 5), matching what a '%#<n>' suffix test accepted
+    if not sep or not (num.isascii() and num.isdigit()) or str(int(num)) != num:
+        return None
+    return int(num)
+
+def _opt_float(leg: Dict[str, Any], key: str) -> Optional[float]:
+    v = leg.get(key)
+    return None if v is None else float(v)
+
+def _leg_index_row(gk: str, leg: Dict[str, Any]) -> tuple:
+    """legs_index row (PENDING, no ticket) for one OPEN leg dict; one lookup per field."""
+    get = leg.get
+    tag = get('tag') or get('leg_id')
+    return (gk, tag, _leg_idx_from_tag(tag), get('symbol'),
+            float(get('volume') or 0.0), float(get('entry') or 0.0),
+            _opt_float(leg, 'sl'), _opt_float(leg, 'tp'),
+            None, 'PENDING')
+
 def record_open(action: Dict[str, Any]) -> str:
     """Insert OPEN action legs as PENDING into index. Returns group_key."""
     _ensure_db()
     gk = _gk_for_open(action)
     src = str(action.get("source_msg_id",""))
-    with sqlite3.connect(DB_PATH) as con:
-        cur = con.cursor()
-        cur.execute("INSERT OR IGNORE INTO signals(source_msg_id, chat_id, msg_ts, group_key) VALUES (?,?,?,?)",
-                    (src, None, None, gk))
-        for leg in action.get("legs", []):
-            cur.execute("""                    INSERT OR IGNORE INTO legs_index(group_key, leg_tag, symbol, volume, entry, sl, tp, ticket, status)
-                VALUES (?,?,?,?,?,?,?,?,?)
-            """, (gk, leg.get('tag') or leg.get('leg_id'), leg.get('symbol'), float(leg.get('volume') or 0.0), float(leg.get('entry') or 0.0), None if leg.get('sl') is None else float(leg.get('sl')), None if leg.get('tp') is None else float(leg.get('tp')), None, 'PENDING'))
-        con.commit()
+    rows = [_leg_index_row(gk, leg) for leg in action.get("legs", [])]
+    with _transaction() as con:
+        con.execute(_SQL_INSERT_SIGNAL, (src, None, None, gk))
+        con.executemany(_SQL_INSERT_LEG, rows)
     return gk
 
+_ACK_COLUMNS = ("client_id", "status", "order_ticket", "error_code", "error_text")
+_ACK_HEADER = ",".join(_ACK_COLUMNS) + "\r\n"
+_CSV_SPECIAL = frozenset(',"\r\n')
+
 def _fake_ticket(seed: str) -> str:
-    h = hashlib.sha1(seed.encode("utf-8")).hexdigest()[:10].upper()
-    return f"FAKE{h}"
+    # Deterministic per seed: "FAKE" + 10 upper-case hex chars (a 5-byte blake2b digest).
+    # Values differ from the older sha1-prefix tickets; only paper-mode ACKs use them.
+    return "FAKE" + hashlib.blake2b(seed.encode("utf-8"), digest_size=5).hexdigest().upper()
 
 def generate_mock_ack_for_open(action: Dict[str, Any]) -> str:
     """Create an ACK CSV for this OPEN (deterministic fake tickets) and update index to OPEN."""
@@ -136,77 +245,77 @@ def generate_mock_ack_for_open(action: Dict[str, Any]) -> str:
     action_id = action.get("action_id","")
     src = str(action.get("source_msg_id",""))
     gk = _gk_for_open(action)
-    # Update index and build rows
-    rows = [("client_id","status","order_ticket","error_code","error_text")]
-    with sqlite3.connect(DB_PATH) as con:
-        cur = con.cursor()
-        for leg in action.get("legs", []):
-            tag = leg.get("tag") or leg.get("leg_id")
-            ticket = _fake_ticket(f"{src}:{tag}")
-            # apply to index
-            cur.execute("""                    UPDATE legs_index
-                   SET ticket=?, status='OPEN'
-                 WHERE group_key=? AND leg_tag=?
-            """, (ticket, gk, tag))
-            rows.append((action_id, "OK", ticket, "0", ""))
-        con.commit()
+    # Tickets are computed once and shared by the index update and the CSV rows
+    tags = [leg.get("tag") or leg.get("leg_id") for leg in action.get("legs", [])]
+    tickets = [_fake_ticket(f"{src}:{tag}") for tag in tags]
+    # apply to index in one batch
+    with _transaction() as con:
+        con.executemany(_SQL_MOCK_ACK, zip(tickets, repeat(gk), tags))
     # Write ack csv
     out_path = ACKS_DIR / f"ack_{action_id}.csv"
-    with out_path.open("w", newline="", encoding="utf-8") as f:
-        w = csv.writer(f)
-        w.writerows(rows)
+    with out_path.open("w", newline="", encoding="utf-8", buffering=1 << 16) as f:
+        client_id = str(action_id)
+        if _CSV_SPECIAL.isdisjoint(client_id):
+            # Tickets are hex and the other fields are constants, so nothing needs quoting:
+            # emit exactly what csv.writer would in a single write
+            f.write(_ACK_HEADER + "".join([f"{client_id},OK,{t},0,\r\n" for t in tickets]))
+        else:
+            w = csv.writer(f)
+            w.writerow(_ACK_COLUMNS)
+            w.writerows((action_id, "OK", t, "0", "") for t in tickets)
     return str(out_path)
 
 # Alternative fix for app/refindex.py - sort in Python instead
 
-def list_open_legs(group_key: str) -> List[Dict[str, Any]]:
-    """List all legs for a group, properly sorted by leg number."""
+_LIST_FETCH_SIZE = 256
+
+def _leg_sort_key(row: Dict[str, Any]) -> int:
+    """Sort by the numeric part after '#'; tags without one go last."""
+    tag = row.get('leg_tag', '')
+    if '#' in tag:
+        try:
+            return int(tag.split('#')[1])
+        except (ValueError, IndexError):
+            return 999  # Put invalid ones at the end
+    return 999
+
+def iter_open_legs(group_key: str) -> Iterator[Dict[str, Any]]:
+    """Stream the legs of a group as dicts, in insertion order.
+
+    Rows are fetched in batches of _LIST_FETCH_SIZE; the pooled connection is
+    held until the generator is exhausted or closed, so consume it promptly.
+    """
     _ensure_db()
-    with sqlite3.connect(DB_PATH) as con:
-        con.row_factory = sqlite3.Row
+    with get_db_manager().get_connection() as con:
+        # Row factory on the cursor only: the pooled connection is shared with other modules
         cur = con.cursor()
-        cur.execute("""
-            SELECT leg_tag,
-                   symbol,
-                   volume,
-                   entry,
-                   sl,
-                   tp,
-                   ticket,
-                   order_ticket,
-                   position_ticket,
-                   status
-              FROM legs_index
-             WHERE group_key=?
-        """, (group_key,))
-        
-        rows = [dict(r) for r in cur.fetchall()]
-        
-        # Sort by the numeric part after '#'
-        def get_leg_number(row):
-            tag = row.get('leg_tag', '')
-            if '#' in tag:
-                try:
-                    return int(tag.split('#')[1])
-                except (ValueError, IndexError):
-                    return 999  # Put invalid ones at the end
-            return 999
-        
-        rows.sort(key=get_leg_number)
-        return rows
+        cur.row_factory = sqlite3.Row
+        cur.execute(_SQL_LIST_LEGS, (group_key,))
+        fetch = cur.fetchmany
+        while True:
+            rows = fetch(_LIST_FETCH_SIZE)
+            if not rows:
+                break
+            yield from map(dict, rows)
+
+def list_open_legs(group_key: str) -> List[Dict[str, Any]]:
+    """List all legs for a group, properly sorted by leg number."""
+    rows = list(iter_open_legs(group_key))
+    rows.sort(key=_leg_sort_key)
+    return rows
 
 def update_leg_targets(group_key: str, leg_tag: str, *, sl: float | None = None, tp: float | None = None) -> None:
     """Persist desired SL/TP targets into legs_index for a specific leg.
     This acts as 'desired' values even if a pending cannot be modified immediately.
     """
     _ensure_db()
-    with sqlite3.connect(DB_PATH) as con:
-        cur = con.cursor()
+    if sl is None and tp is None:
+        return
+    with _transaction() as con:
         if sl is not None:
-            cur.execute("""UPDATE legs_index SET sl=? WHERE group_key=? AND leg_tag=?""", (float(sl), group_key, leg_tag))
+            con.execute(_SQL_SET_SL, (float(sl), group_key, leg_tag))
         if tp is not None:
-            cur.execute("""UPDATE legs_index SET tp=? WHERE group_key=? AND leg_tag=?""", (float(tp), group_key, leg_tag))
-        con.commit()
+            con.execute(_SQL_SET_TP, (float(tp), group_key, leg_tag))
 
 def resolve_group_key_from_reply(source_msg_id: str) -> str:
     # For now group key is derived from original OPEN source_msg_id
@@ -223,8 +332,7 @@ def resolve_group_key(text: str = "", reply_to_msg_id: str | None = None) -> str
     if reply_to_msg_id:
         return resolve_group_key_from_reply(str(reply_to_msg_id))
     # optional lightweight fallback via marker
-    import re
-    m = re.search(r"\[GK:(?P<gk>OPEN_[^\]]+)\]", text or "")
+    m = _GK_MARK_RE.search(text or "")
     if m:
-        return m.group("gk")
+        return m.group(1)
     return None
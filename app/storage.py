@@ -5,9 +5,15 @@ This replaces the old connection management with proper pooling and locking.
 """
 
 from __future__ import annotations
+import json
 import logging
+import sqlite3
+import threading
 import time
-from typing import List, Optional
+import zlib
+from collections import namedtuple
+from operator import itemgetter
+from typing import List, Optional, Set
 from pydantic import TypeAdapter
 
 from app.models import Action, RouterResult
@@ -15,6 +21,47 @@ from app.common.database import get_db_manager
 
 log = logging.getLogger("storage")
 
+# Queue payloads and execution results are stored as zlib-compressed JSON behind a
+# one-byte tag. Rows written before compression start with '{' and are read as-is.
+_PAYLOAD_ZLIB = b"\x01"
+_PAYLOAD_ZLIB_DICT = b"\x02"
+_PAYLOAD_LEVEL = 1
+
+# Preset dictionary for _PAYLOAD_ZLIB_DICT: the field names and literals every
+# Action/RouterResult repeats, so even a one-leg payload compresses well. Rows
+# written with it can only be read back with the exact same bytes -- never edit
+# this; add a new tag and dictionary instead.
+_PAYLOAD_ZDICT = (
+    b'"retcode_label":null,"server_comment":null,"request_comment":null,"comment":null,'
+    b'"order":0,"deal":0,"request":{"action":1,"symbol":"XAUUSD","volume":0.01,"type":0,'
+    b'"price":0.0,"sl":0.0,"tp":0.0,"deviation":20,"magic":0,"comment":"","type_time":0,'
+    b'"type_filling":0},"tried_fillings":["RETURN","IOC","FOK"],"ok":true,"target":"position",'
+    b'"ticket":0,"skipped":true,"reason":"no_order","details":{"retcode":10009,'
+    b'{"action_id":"","status":"OK","error_code":null,"error_text":null,'
+    b'"details":{"backend":"native","mode":"","results":[{"leg":"#1","result":'
+    b'{"action_id":"","type":"OPEN","venue":"MT5","legs":[{"leg_id":"#1","symbol":"XAUUSD",'
+    b'"side":"BUY","volume":0.01,"entry":null,"sl":null,"tp":null,"tag":"#1",'
+    b'"position_ticket":null,"order_ticket":null},{"leg_id":"#2","symbol":"XAUUSD",'
+    b'"side":"SELL","volume":0.01,"entry":null,"sl":null,"tp":null,"tag":"#2",'
+    b'"position_ticket":null,"order_ticket":null}],"source_msg_id":"","created_ts":'
+)
+
+def encode_payload(raw: bytes) -> bytes:
+    """Compress a JSON payload for storage in queue/executions."""
+    c = zlib.compressobj(_PAYLOAD_LEVEL, zdict=_PAYLOAD_ZDICT)
+    return _PAYLOAD_ZLIB_DICT + c.compress(raw) + c.flush()
+
+def decode_payload(blob) -> bytes:
+    """Return the JSON bytes of a stored payload (compressed or legacy raw)."""
+    data = blob if isinstance(blob, bytes) else str(blob).encode("utf-8")
+    tag = data[:1]
+    if tag == _PAYLOAD_ZLIB_DICT:
+        d = zlib.decompressobj(zdict=_PAYLOAD_ZDICT)
+        return d.decompress(data[1:]) + d.flush()
+    if tag == _PAYLOAD_ZLIB:
+        return zlib.decompress(data[1:])
+    return data
+
 # Keep this function for backward compatibility
 def get_db_path() -> str:
     """Get the database path."""
@@ -26,6 +73,8 @@ def init_db() -> None:
     db_manager.initialize_schema()
     log.info("Database initialized", extra={"db_path": db_manager.db_path})
 
+_SQL_ENQUEUE = "INSERT INTO queue(action_id, payload, status, ts) VALUES(?,?,?,?)"
+
 def enqueue(action: Action) -> bool:
     """
     Add an action to the processing queue.
@@ -35,40 +84,89 @@ def enqueue(action: Action) -> bool:
     
     try:
         db_manager.execute_one(
-            "INSERT INTO queue(action_id, payload, status, ts) VALUES(?,?,?,?)",
-            (action.action_id, action.model_dump_json().encode("utf-8"), "PENDING", time.time())
+            _SQL_ENQUEUE,
+            (action.action_id, encode_payload(action.model_dump_json().encode("utf-8")), "PENDING", time.time())
         )
         log.debug("Action enqueued", extra={"action_id": action.action_id, "type": action.type})
         return True
         
+    except sqlite3.IntegrityError:
+        # action_id is the primary key: already exists -> treat as dedup OK
+        log.debug("Action already enqueued (dedup)", extra={"action_id": action.action_id})
+        return False
     except Exception as e:
-        if "UNIQUE constraint failed" in str(e):
-            # Already exists -> treat as dedup OK
-            log.debug("Action already enqueued (dedup)", extra={"action_id": action.action_id})
-            return False
-        else:
-            log.error("Failed to enqueue action", extra={"action_id": action.action_id, "error": str(e)})
-            raise
+        log.error("Failed to enqueue action", extra={"action_id": action.action_id, "error": str(e)})
+        raise
 
-def fetch_batch(limit: int = 32) -> List[Action]:
+# RETURNING yields a row only for an inserted action; a conflicting (already queued) one yields nothing
+_SQL_ENQUEUE_IGNORE = (
+    "INSERT INTO queue(action_id, payload, status, ts) VALUES(?,?,?,?) "
+    "ON CONFLICT(action_id) DO NOTHING RETURNING action_id"
+)
+
+def enqueue_many(actions: List[Action]) -> Set[str]:
     """
-    Fetch a batch of pending actions for processing.
-    Returns them in order of creation (FIFO).
+    Add several actions to the processing queue in one transaction.
+    Returns the action_ids that were added; actions already queued are skipped (dedup).
     """
+    if not actions:
+        return set()
+    
+    now = time.time()
+    rows = [
+        (a.action_id, encode_payload(a.model_dump_json().encode("utf-8")), "PENDING", now)
+        for a in actions
+    ]
+    
+    added: Set[str] = set()
     db_manager = get_db_manager()
+    with db_manager.get_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # executemany cannot return rows: insert one by one inside the single transaction
+            for row in rows:
+                if conn.execute(_SQL_ENQUEUE_IGNORE, row).fetchone() is not None:
+                    added.add(row[0])
+            conn.execute("COMMIT")
+        except Exception as e:
+            log.error("Failed to enqueue actions", extra={"count": len(rows), "error": str(e)})
+            raise
+        finally:
+            # Statement or COMMIT failed: never hand the pooled connection back mid-transaction
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
     
-    rows = db_manager.fetchall(
-        "SELECT action_id, payload FROM queue WHERE status='PENDING' ORDER BY ts LIMIT ?",
-        (limit,)
-    )
+    log.debug("Actions enqueued", extra={"count": len(added), "requested": len(rows)})
+    return added
+
+_ACTION_ADAPTER = TypeAdapter(Action)
+_ACTION_LIST_ADAPTER = TypeAdapter(List[Action])
+_RESULT_ADAPTER = TypeAdapter(RouterResult)
+
+def _decode_actions(rows: list, limit: int) -> List[Action]:
+    """Turn (action_id, payload, ...) rows into Actions, failing any row that does not deserialize."""
+    if not rows:
+        return []
     
-    # Convert JSON payloads back to Action objects
+    # Convert JSON payloads back to Action objects: one validate_json over the whole batch
+    try:
+        actions = _ACTION_LIST_ADAPTER.validate_json(
+            b"[" + b",".join([decode_payload(row[1]) for row in rows]) + b"]"
+        )
+        # A payload holding more than one JSON value would shift the array; only trust an exact fit
+        if len(actions) == len(rows):
+            log.debug("Fetched batch", extra={"count": len(actions), "requested": limit})
+            return actions
+    except Exception:
+        pass
+    
+    # Some payload is bad: validate row by row to isolate (and fail) it
     actions: List[Action] = []
-    ta = TypeAdapter(Action)
+    ta = _ACTION_ADAPTER
     
-    for action_id, payload in rows:
+    for action_id, payload, *_ in rows:
         try:
-            action = ta.validate_json(payload)
+            action = ta.validate_json(decode_payload(payload))
             actions.append(action)
         except Exception as e:
             log.error("Failed to deserialize action", extra={
@@ -83,32 +181,93 @@ def fetch_batch(limit: int = 32) -> List[Action]:
     
     return actions
 
+_SQL_FETCH_BATCH = "SELECT action_id, payload FROM queue WHERE status='PENDING' ORDER BY ts LIMIT ?"
+
+def fetch_batch(limit: int = 32) -> List[Action]:
+    """
+    Fetch a batch of pending actions for processing.
+    Returns them in order of creation (FIFO).
+    """
+    db_manager = get_db_manager()
+    
+    rows = db_manager.fetchall(_SQL_FETCH_BATCH, (limit,))
+    
+    return _decode_actions(rows, limit)
+
+_SQL_CLAIM_BATCH = """
+    UPDATE queue SET status='IN_PROGRESS'
+     WHERE action_id IN (
+        SELECT action_id FROM queue WHERE status='PENDING' ORDER BY ts LIMIT ?
+     )
+    RETURNING action_id, payload, ts
+"""
+
+def claim_batch(limit: int = 32) -> List[Action]:
+    """
+    Atomically move up to `limit` of the oldest pending actions to IN_PROGRESS
+    and return them in order of creation (FIFO).
+    
+    Equivalent to fetch_batch() followed by mark_in_progress() for every row,
+    in a single statement. Rows left IN_PROGRESS by a crash are recovered by
+    reset_in_progress_to_pending() on startup.
+    """
+    db_manager = get_db_manager()
+    
+    claimed = db_manager.fetchall(_SQL_CLAIM_BATCH, (limit,))
+    # RETURNING does not preserve the subquery's ORDER BY
+    claimed.sort(key=itemgetter(2))
+    return _decode_actions(claimed, limit)
+
+_SQL_RELEASE_CLAIMED = "UPDATE queue SET status='PENDING' WHERE action_id=? AND status='IN_PROGRESS'"
+
+def release_claimed(action_ids: List[str]) -> None:
+    """
+    Put claimed actions that were never started back to PENDING, so the next
+    poll picks them up instead of waiting for the startup reset.
+    """
+    if not action_ids:
+        return
+    
+    db_manager = get_db_manager()
+    db_manager.executemany(_SQL_RELEASE_CLAIMED, [(action_id,) for action_id in action_ids])
+    
+    log.debug("Released claimed actions", extra={"count": len(action_ids)})
+
+_SQL_MARK_IN_PROGRESS = "UPDATE queue SET status='IN_PROGRESS' WHERE action_id=?"
+
 def mark_in_progress(action_id: str) -> None:
     """Mark an action as currently being processed."""
     db_manager = get_db_manager()
     
-    result = db_manager.execute_one(
-        "UPDATE queue SET status='IN_PROGRESS' WHERE action_id=?", 
-        (action_id,)
-    )
+    result = db_manager.execute_one(_SQL_MARK_IN_PROGRESS, (action_id,))
     
     if result.rowcount == 0:
         log.warning("Tried to mark non-existent action as in-progress", 
                    extra={"action_id": action_id})
 
-def mark_done(action_id: str, result: RouterResult) -> None:
-    """Mark an action as completed and save the execution result."""
+# Re-completing a DONE row (e.g. the dedup path) leaves the queue page untouched
+_SQL_MARK_DONE_Q = "UPDATE queue SET status='DONE' WHERE action_id=? AND status!='DONE'"
+_SQL_EXEC_INS = "INSERT OR REPLACE INTO executions(action_id, status, router_result, ts) VALUES(?,?,?,?)"
+
+def _record_execution(action_id: str, status: str, router_result: bytes) -> None:
+    """Mark the queue row DONE and store its result in one transaction."""
     db_manager = get_db_manager()
     
     with db_manager.get_connection() as conn:
-        # Update queue status
-        conn.execute("UPDATE queue SET status='DONE' WHERE action_id=?", (action_id,))
-        
-        # Save execution result
-        conn.execute(
-            "INSERT OR REPLACE INTO executions(action_id, status, router_result, ts) VALUES(?,?,?,?)",
-            (action_id, result.status, result.model_dump_json().encode("utf-8"), time.time())
-        )
+        # The pool runs in autocommit mode; group both writes so they commit (and sync) once
+        conn.execute("BEGIN")
+        try:
+            conn.execute(_SQL_MARK_DONE_Q, (action_id,))
+            conn.execute(_SQL_EXEC_INS, (action_id, status, router_result, time.time()))
+            conn.execute("COMMIT")
+        finally:
+            # Statement or COMMIT failed: never hand the pooled connection back mid-transaction
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+
+def mark_done(action_id: str, result: RouterResult) -> None:
+    """Mark an action as completed and save the execution result."""
+    _record_execution(action_id, result.status, encode_payload(result.model_dump_json().encode("utf-8")))
     
     log.debug("Action marked as done", extra={
         "action_id": action_id, 
@@ -116,36 +275,76 @@ def mark_done(action_id: str, result: RouterResult) -> None:
         "has_error": bool(getattr(result, 'error_code', None))
     })
 
+def mark_done_many(items: List[tuple]) -> None:
+    """
+    Mark several actions completed and save their (action_id, RouterResult) pairs
+    in one transaction, so the whole group commits (and syncs) once.
+    """
+    if not items:
+        return
+    
+    now = time.time()
+    exec_rows = [
+        (action_id, result.status, encode_payload(result.model_dump_json().encode("utf-8")), now)
+        for action_id, result in items
+    ]
+    
+    db_manager = get_db_manager()
+    with db_manager.get_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(_SQL_MARK_DONE_Q, [(row[0],) for row in exec_rows])
+            conn.executemany(_SQL_EXEC_INS, exec_rows)
+            conn.execute("COMMIT")
+        finally:
+            # Statement or COMMIT failed: never hand the pooled connection back mid-transaction
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+    
+    log.debug("Actions marked as done", extra={"count": len(exec_rows)})
+
 def mark_failed(action_id: str, error_message: str) -> None:
     """Mark an action as failed with an error message."""
-    db_manager = get_db_manager()
-    
-    # Create a failed RouterResult
-    from app.models import RouterResult
-    failed_result = RouterResult(
-        action_id=action_id,
-        status="ERROR", 
-        error_code=9999,
-        error_text=error_message
+    # Same JSON a RouterResult(status="ERROR", error_code=9999) would serialise to,
+    # without building and dumping the model on the error path
+    payload = json.dumps(
+        {"action_id": action_id, "status": "ERROR", "error_code": 9999,
+         "error_text": error_message, "details": None},
+        ensure_ascii=False, separators=(",", ":"),
     )
+    _record_execution(action_id, "ERROR", encode_payload(payload.encode("utf-8")))
     
-    mark_done(action_id, failed_result)
+    log.debug("Action marked as done", extra={
+        "action_id": action_id, 
+        "status": "ERROR",
+        "has_error": True
+    })
+
+_SQL_WAS_EXECUTED = "SELECT 1 FROM executions WHERE action_id=? LIMIT 1"
+_SQL_EXEC_RESULT = "SELECT router_result FROM executions WHERE action_id=?"
+
+def was_executed(action_id: str) -> bool:
+    """
+    Check whether an action has an execution record, without loading the result.
+    
+    Answered from the executions primary-key index alone; use already_executed()
+    when the stored RouterResult itself is needed.
+    """
+    db_manager = get_db_manager()
+    
+    return db_manager.fetchone_ro(_SQL_WAS_EXECUTED, (action_id,)) is not None
 
 def already_executed(action_id: str) -> Optional[RouterResult]:
     """Check if an action has already been executed."""
     db_manager = get_db_manager()
     
-    row = db_manager.fetchone(
-        "SELECT router_result FROM executions WHERE action_id=?", 
-        (action_id,)
-    )
+    row = db_manager.fetchone_ro(_SQL_EXEC_RESULT, (action_id,))
     
     if not row:
         return None
         
     try:
-        ta = TypeAdapter(RouterResult)
-        return ta.validate_json(row[0])
+        return _RESULT_ADAPTER.validate_json(decode_payload(row[0]))
     except Exception as e:
         log.error("Failed to deserialize execution result", extra={
             "action_id": action_id, 
@@ -160,29 +359,73 @@ def reset_in_progress_to_pending() -> int:
     """
     db_manager = get_db_manager()
     
-    result = db_manager.execute_one(
-        "UPDATE queue SET status='PENDING' WHERE status='IN_PROGRESS'"
-    )
+    with db_manager.get_write_connection() as conn:
+        count = conn.execute(
+            "UPDATE queue SET status='PENDING' WHERE status='IN_PROGRESS'"
+        ).rowcount or 0
     
-    count = result.rowcount or 0
     if count > 0:
         log.info("Reset in-progress actions to pending", extra={"count": count})
     
     return count
 
+_SQL_QUEUE_COUNTS = """
+    SELECT SUM(CASE WHEN status='PENDING' THEN 1 ELSE 0 END),
+           SUM(CASE WHEN status='IN_PROGRESS' THEN 1 ELSE 0 END),
+           SUM(CASE WHEN status='DONE' THEN 1 ELSE 0 END)
+      FROM queue
+"""
+
+# Monitoring polls queue_counts() far more often than the numbers meaningfully change;
+# serve them from a short-lived snapshot
+_COUNTS_TTL = 1.0
+_counts_cache: tuple = (0.0, None)  # (monotonic ts, counts)
+_counts_lock = threading.Lock()
+
 def queue_counts() -> dict:
-    """Get count of actions by status for monitoring."""
-    db_manager = get_db_manager()
-    
-    rows = db_manager.fetchall("SELECT status, COUNT(*) FROM queue GROUP BY status")
-    counts = {status: count for status, count in rows}
-    
-    # Always include common statuses even if count is 0
-    for status in ['PENDING', 'IN_PROGRESS', 'DONE']:
-        if status not in counts:
-            counts[status] = 0
-            
-    return counts
+    """Get count of actions by status for monitoring (at most _COUNTS_TTL seconds old)."""
+    global _counts_cache
+    ts, counts = _counts_cache
+    if counts is None or time.monotonic() - ts >= _COUNTS_TTL:
+        with _counts_lock:
+            ts, counts = _counts_cache
+            if counts is None or time.monotonic() - ts >= _COUNTS_TTL:
+                db_manager = get_db_manager()
+                
+                # These are the only statuses the queue uses; one pass, always one row
+                row = db_manager.fetchone_ro(_SQL_QUEUE_COUNTS)
+                
+                counts = {
+                    'PENDING': row[0] or 0,
+                    'IN_PROGRESS': row[1] or 0,
+                    'DONE': row[2] or 0,
+                }
+                _counts_cache = (time.monotonic(), counts)
+    
+    return dict(counts)
+
+# Cleanup deletes run in bounded chunks (each its own autocommit transaction) so a
+# large backlog never holds the writer lock for the whole scan
+_CLEANUP_CHUNK = 5000
+_SQL_CLEANUP_QUEUE = """
+    DELETE FROM queue WHERE rowid IN (
+        SELECT rowid FROM queue WHERE status='DONE' AND ts < ? LIMIT ?
+    )
+"""
+_SQL_CLEANUP_EXECUTIONS = """
+    DELETE FROM executions WHERE rowid IN (
+        SELECT rowid FROM executions WHERE ts < ? LIMIT ?
+    )
+"""
+
+def _delete_in_chunks(conn, sql: str, cutoff_ts: float) -> int:
+    """Run a chunked DELETE until a short chunk comes back; returns rows deleted."""
+    total = 0
+    while True:
+        deleted = conn.execute(sql, (cutoff_ts, _CLEANUP_CHUNK)).rowcount or 0
+        total += deleted
+        if deleted < _CLEANUP_CHUNK:
+            return total
 
 def cleanup_old_records(days_old: int = 7) -> dict:
     """
@@ -192,22 +435,16 @@ def cleanup_old_records(days_old: int = 7) -> dict:
     db_manager = get_db_manager()
     cutoff_ts = time.time() - (days_old * 24 * 60 * 60)
     
-    with db_manager.get_connection() as conn:
+    with db_manager.get_write_connection() as conn:
         # Delete old completed queue entries
-        queue_result = conn.execute(
-            "DELETE FROM queue WHERE status='DONE' AND ts < ?", 
-            (cutoff_ts,)
-        )
+        queue_deleted = _delete_in_chunks(conn, _SQL_CLEANUP_QUEUE, cutoff_ts)
         
         # Delete old executions
-        exec_result = conn.execute(
-            "DELETE FROM executions WHERE ts < ?", 
-            (cutoff_ts,)
-        )
+        exec_deleted = _delete_in_chunks(conn, _SQL_CLEANUP_EXECUTIONS, cutoff_ts)
     
     counts = {
-        "queue_deleted": queue_result.rowcount or 0,
-        "executions_deleted": exec_result.rowcount or 0,
+        "queue_deleted": queue_deleted,
+        "executions_deleted": exec_deleted,
         "cutoff_days": days_old
     }
     
@@ -217,30 +454,34 @@ def cleanup_old_records(days_old: int = 7) -> dict:
     return counts
 
 # Health check function
+_SQL_STORAGE_HEALTH = """
+    SELECT SUM(CASE WHEN status='PENDING' THEN 1 ELSE 0 END),
+           SUM(CASE WHEN status='IN_PROGRESS' THEN 1 ELSE 0 END),
+           SUM(CASE WHEN status='DONE' THEN 1 ELSE 0 END),
+           (SELECT COUNT(*) FROM executions)
+      FROM queue
+"""
+
 def get_storage_health() -> dict:
     """Get storage system health information."""
     db_manager = get_db_manager()
     
     try:
-        # Basic connectivity test
-        test_result = db_manager.fetchone("SELECT 1")
-        is_healthy = test_result is not None
+        # One query doubles as the connectivity test: if it answers, storage is healthy
+        row = db_manager.fetchone_ro(_SQL_STORAGE_HEALTH)
         
-        # Get basic stats
-        stats = {
-            "healthy": is_healthy,
+        return {
+            "healthy": True,
             "db_path": db_manager.db_path,
             "connection_stats": db_manager.get_stats(),
-            "queue_counts": queue_counts() if is_healthy else {},
+            "queue_counts": {
+                'PENDING': row[0] or 0,
+                'IN_PROGRESS': row[1] or 0,
+                'DONE': row[2] or 0,
+            },
+            "total_executions": row[3],
         }
         
-        if is_healthy:
-            # Get total execution count
-            exec_count = db_manager.fetchone("SELECT COUNT(*) FROM executions")
-            stats["total_executions"] = exec_count[0] if exec_count else 0
-        
-        return stats
-        
     except Exception as e:
         return {
             "healthy": False,
@@ -250,6 +491,16 @@ def get_storage_health() -> dict:
     
 # Add these functions to the end of your existing storage.py file:
 
+_SQL_UPDATE_FILLED_PRICE = """
+    UPDATE legs_index 
+    SET filled_price = ?,
+        entry_price = COALESCE(entry_price, ?),
+        position_ticket = COALESCE(?, position_ticket),
+        is_filled = 1,
+        filled_at = COALESCE(filled_at, datetime('now'))
+    WHERE group_key = ? AND leg_tag = ?
+"""
+
 def update_filled_price(group_key: str, leg_tag: str, filled_price: float, 
                         position_ticket: int = None) -> bool:
     """
@@ -267,15 +518,10 @@ def update_filled_price(group_key: str, leg_tag: str, filled_price: float,
     db_manager = get_db_manager()
     
     try:
-        db_manager.execute_one("""
-            UPDATE legs_index 
-            SET filled_price = ?,
-                entry_price = COALESCE(entry_price, ?),
-                position_ticket = COALESCE(?, position_ticket),
-                is_filled = 1,
-                filled_at = COALESCE(filled_at, datetime('now'))
-            WHERE group_key = ? AND leg_tag = ?
-        """, (filled_price, filled_price, position_ticket, group_key, leg_tag))
+        db_manager.execute_one(
+            _SQL_UPDATE_FILLED_PRICE,
+            (filled_price, filled_price, position_ticket, group_key, leg_tag)
+        )
         
         log.debug(f"Updated filled price: group={group_key} leg={leg_tag} price={filled_price}")
         return True
@@ -289,7 +535,18 @@ def update_filled_price(group_key: str, leg_tag: str, filled_price: float,
         return False
 
 
-def get_filled_legs(group_key: str) -> List[dict]:
+# Leg rows as returned by get_filled_legs / get_pending_legs; fields follow the SELECT
+# column order so rows are wrapped as-is (use ._asdict() where a dict is needed).
+# legs_index does not store the side; it lives on the OPEN action.
+FilledLeg = namedtuple("FilledLeg", [
+    "leg_tag", "symbol", "volume", "filled_price", "entry_price",
+    "position_ticket", "order_ticket", "current_sl", "current_tp", "filled_at", "is_risk_free",
+])
+PendingLeg = namedtuple("PendingLeg", [
+    "leg_tag", "symbol", "volume", "order_ticket", "sl", "tp",
+])
+
+def get_filled_legs(group_key: str) -> List[FilledLeg]:
     """
     Get all filled legs for a message group.
     
@@ -297,16 +554,15 @@ def get_filled_legs(group_key: str) -> List[dict]:
         group_key: The group identifier (e.g., "OPEN_1234")
     
     Returns:
-        List of dicts containing leg information.
+        List of FilledLeg tuples containing leg information.
     """
     db_manager = get_db_manager()
     
     try:
-        rows = db_manager.fetchall("""
+        rows = db_manager.fetchall_ro("""
             SELECT 
                 leg_tag,
                 symbol,
-                side,
                 volume,
                 filled_price,
                 entry_price,
@@ -321,23 +577,7 @@ def get_filled_legs(group_key: str) -> List[dict]:
             ORDER BY leg_tag
         """, (group_key,))
         
-        return [
-            {
-                'leg_tag': row[0],
-                'symbol': row[1],
-                'side': row[2],
-                'volume': row[3],
-                'filled_price': row[4],
-                'entry_price': row[5],
-                'position_ticket': row[6],
-                'order_ticket': row[7],
-                'current_sl': row[8],
-                'current_tp': row[9],
-                'filled_at': row[10],
-                'is_risk_free': row[11]
-            }
-            for row in rows
-        ]
+        return list(map(FilledLeg._make, rows))
         
     except Exception as e:
         log.error(f"Failed to get filled legs: {e}", extra={
@@ -347,6 +587,14 @@ def get_filled_legs(group_key: str) -> List[dict]:
         return []
 
 
+_SQL_AVG_FILLED_PRICE = """
+    SELECT SUM(filled_price * volume) / SUM(volume)
+      FROM legs_index
+     WHERE group_key = ? AND is_filled = 1
+       AND filled_price IS NOT NULL AND filled_price != 0
+       AND volume > 0
+"""
+
 def get_average_filled_price(group_key: str) -> Optional[float]:
     """
     Calculate the average filled price for all filled positions in a group.
@@ -357,29 +605,22 @@ def get_average_filled_price(group_key: str) -> Optional[float]:
     Returns:
         Average filled price or None if no filled positions.
     """
-    filled_legs = get_filled_legs(group_key)
+    db_manager = get_db_manager()
     
-    if not filled_legs:
+    try:
+        # Volume-weighted average computed by SQLite; NULL when no leg qualifies
+        row = db_manager.fetchone_ro(_SQL_AVG_FILLED_PRICE, (group_key,))
+        return row[0] if row else None
+        
+    except Exception as e:
+        log.error(f"Failed to get average filled price: {e}", extra={
+            "group_key": group_key,
+            "error": str(e)
+        })
         return None
-    
-    # Calculate weighted average by volume
-    total_volume = 0.0
-    weighted_sum = 0.0
-    
-    for leg in filled_legs:
-        if leg['filled_price'] and leg['volume']:
-            volume = float(leg['volume'])
-            price = float(leg['filled_price'])
-            weighted_sum += price * volume
-            total_volume += volume
-    
-    if total_volume > 0:
-        return weighted_sum / total_volume
-    
-    return None
 
 
-def get_pending_legs(group_key: str) -> List[dict]:
+def get_pending_legs(group_key: str) -> List[PendingLeg]:
     """
     Get all pending (unfilled) legs for a message group.
     
@@ -387,16 +628,15 @@ def get_pending_legs(group_key: str) -> List[dict]:
         group_key: The group identifier (e.g., "OPEN_1234")
     
     Returns:
-        List of dicts containing leg information.
+        List of PendingLeg tuples containing leg information.
     """
     db_manager = get_db_manager()
     
     try:
-        rows = db_manager.fetchall("""
+        rows = db_manager.fetchall_ro("""
             SELECT 
                 leg_tag,
                 symbol,
-                side,
                 volume,
                 order_ticket,
                 sl,
@@ -408,18 +648,7 @@ def get_pending_legs(group_key: str) -> List[dict]:
             ORDER BY leg_tag
         """, (group_key,))
         
-        return [
-            {
-                'leg_tag': row[0],
-                'symbol': row[1],
-                'side': row[2],
-                'volume': row[3],
-                'order_ticket': row[4],
-                'sl': row[5],
-                'tp': row[6]
-            }
-            for row in rows
-        ]
+        return list(map(PendingLeg._make, rows))
         
     except Exception as e:
         log.error(f"Failed to get pending legs: {e}", extra={
@@ -472,13 +701,16 @@ def is_group_risk_free(group_key: str) -> bool:
     db_manager = get_db_manager()
     
     try:
-        result = db_manager.fetchone("""
-            SELECT COUNT(*) 
-            FROM legs_index 
-            WHERE group_key = ? AND is_risk_free = 1
+        # Stops at the first match (a single idx_legs_group_risk_free probe)
+        result = db_manager.fetchone_ro("""
+            SELECT EXISTS(
+                SELECT 1
+                FROM legs_index
+                WHERE group_key = ? AND is_risk_free = 1
+            )
         """, (group_key,))
         
-        return result[0] > 0 if result else False
+        return bool(result[0]) if result else False
         
     except Exception as e:
         log.error(f"Failed to check risk-free status: {e}", extra={
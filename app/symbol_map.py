@@ -1,9 +1,13 @@
+from functools import lru_cache
+
 SYMBOL_ALIASES = {
     "GOLD": "XAUUSD",
     "XAU": "XAUUSD",
     "US30": "US30",
 }
 
+# Signals repeat a handful of symbols, so nearly every call is a cache hit
+@lru_cache(maxsize=1024)
 def normalize_symbol(sym: str) -> str:
     s = sym.upper().strip()
     return SYMBOL_ALIASES.get(s, s)
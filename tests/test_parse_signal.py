@@ -0,0 +1,37 @@
+"""
+Tests for parse_signal_text (regex parsing of raw Telegram signal text).
+"""
+
+from app.processing import parse_signal_text
+
+
+class TestParseSignal:
+
+    def test_full_signal(self):
+        ps = parse_signal_text("XAUUSD\nSELL @ 3344/3349\n\nTP 3341\nTP 3337\nTP OPEN\nSL 3350\nmax slip 5")
+
+        assert ps.side == 'SELL'
+        assert ps.symbol == 'XAUUSD'
+        assert ps.entries == [3344.0, 3349.0]
+        assert ps.tps == [3341.0, 3337.0, None]
+        assert ps.sl == 3350.0
+        assert ps.max_slip_pips == 5.0
+
+    def test_emoji_and_zero_width_are_ignored(self):
+        ps = parse_signal_text("\U0001F525 GOLD \U0001F525\nBU​Y @ 3332\nTP 3340")
+
+        assert ps.side == 'BUY'
+        assert ps.entries == [3332.0]
+        assert ps.tps == [3340.0]
+
+    def test_repeated_text_returns_independent_results(self):
+        text = "BUY @ 3332\nTP 3340\nTP OPEN\nSL 3320"
+        first = parse_signal_text(text)
+        first.tps.append(9999.0)
+        first.entries.clear()
+
+        second = parse_signal_text(text)
+
+        assert second is not first
+        assert second.entries == [3332.0]
+        assert second.tps == [3340.0, None]
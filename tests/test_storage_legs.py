@@ -0,0 +1,77 @@
+"""
+Tests for enqueueing actions and reading filled / pending legs back from legs_index.
+"""
+
+import pytest
+
+from app import storage
+from app.common import database
+from app.models import Action, Leg
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    manager = database.DatabaseManager(str(tmp_path / "app.db"))
+    manager.initialize_schema()
+    monkeypatch.setattr(database, "_db_manager", manager)
+    yield manager
+    manager.close_all()
+
+
+def _insert_leg(db, leg_tag, **cols):
+    cols = {"group_key": "OPEN_555", "leg_tag": leg_tag, "symbol": "XAUUSD", "volume": 0.01, **cols}
+    names = ", ".join(cols)
+    marks = ", ".join("?" for _ in cols)
+    db.execute_one(f"INSERT INTO legs_index({names}) VALUES({marks})", tuple(cols.values()))
+
+
+class TestLegReads:
+
+    def test_filled_leg_read_back_by_attribute(self, db):
+        _insert_leg(db, "555#1", is_filled=1, filled_price=3450.5, position_ticket=101, current_sl=3440.0)
+        _insert_leg(db, "555#2", order_ticket=202, sl=3440.0, tp=3470.0)
+
+        legs = storage.get_filled_legs("OPEN_555")
+
+        assert len(legs) == 1
+        leg = legs[0]
+        assert leg.leg_tag == "555#1"
+        assert leg.symbol == "XAUUSD"
+        assert leg.volume == 0.01
+        assert leg.filled_price == 3450.5
+        assert leg.position_ticket == 101
+        assert leg.current_sl == 3440.0
+        assert leg.is_risk_free == 0
+
+    def test_pending_leg_read_back_by_attribute(self, db):
+        _insert_leg(db, "555#1", is_filled=1, filled_price=3450.5, order_ticket=101)
+        _insert_leg(db, "555#2", order_ticket=202, sl=3440.0, tp=3470.0)
+        _insert_leg(db, "555#3")  # no order ticket yet -> not pending
+
+        legs = storage.get_pending_legs("OPEN_555")
+
+        assert [leg.leg_tag for leg in legs] == ["555#2"]
+        leg = legs[0]
+        assert leg.order_ticket == 202
+        assert leg.sl == 3440.0
+        assert leg.tp == 3470.0
+        assert leg._asdict()["volume"] == 0.01
+
+
+def _action(action_id):
+    leg = Leg(leg_id=f"{action_id}#1", symbol="XAUUSD", side="BUY", volume=0.01, tag="555")
+    return Action(action_id=action_id, type="OPEN", legs=[leg], source_msg_id="555")
+
+
+class TestEnqueueMany:
+
+    def test_returns_only_newly_added_ids(self, db):
+        assert storage.enqueue_many([_action("A1")]) == {"A1"}
+
+        added = storage.enqueue_many([_action("A1"), _action("A2")])
+
+        assert added == {"A2"}
+        assert db.fetchone("SELECT COUNT(*) FROM queue")[0] == 2
+
+    def test_empty_batch(self, db):
+        assert storage.enqueue_many([]) == set()
@@ -0,0 +1,77 @@
+"""
+Tests for the tick-driven user monitors (TP2 hit / price layers).
+"""
+
+from types import SimpleNamespace
+
+from app.monitors.actions import Alert, DeleteOrder, ModifySLTP
+from app.monitors.user_monitors import ManagePriceLayersMonitor, ManageTP2HitMonitor
+
+
+class FakeMT5:
+    """Minimal MT5 stand-in: static symbol specs and a fixed tick per symbol."""
+
+    def __init__(self, bid, ask):
+        self.tick = SimpleNamespace(bid=bid, ask=ask, last=0.0)
+        self.tick_calls = 0
+
+    def symbol_info(self, symbol):
+        return SimpleNamespace(point=0.01, digits=2)
+
+    def symbol_info_tick(self, symbol):
+        self.tick_calls += 1
+        return self.tick
+
+
+def _row(ticket, leg, side="BUY", tp=None, sl=None, price_open=3450.0, mid="555"):
+    return {"ticket": ticket, "symbol": "XAUUSD", "side": side, "price_open": price_open,
+            "sl": sl, "tp": tp, "message_id": mid, "leg": leg}
+
+
+class TestManageTP2HitMonitor:
+
+    def test_tp2_exceeded_deletes_pending_and_locks_be(self):
+        positions = [_row(1, 1, tp=3460.0), _row(2, 2, tp=3470.0)]
+        orders = [_row(3, 5, tp=3460.0), _row(4, 6, tp=3475.0)]
+        mt5 = FakeMT5(bid=3480.0, ask=3480.5)
+
+        actions = ManageTP2HitMonitor().evaluate(positions, orders, {"mt5": mt5, "env": {}})
+
+        deletes = [a.ticket for a in actions if isinstance(a, DeleteOrder)]
+        mods = {a.ticket: a.sl for a in actions if isinstance(a, ModifySLTP)}
+        assert deletes == [3, 4]
+        assert mods == {1: 3450.1, 2: 3450.1}
+        assert isinstance(actions[-1], Alert)
+
+    def test_uses_max_tp2_not_first(self):
+        # Max TP2 among legs 2/6 is 3475 -> price 3472 has not exceeded it yet
+        positions = [_row(2, 2, tp=3470.0)]
+        orders = [_row(6, 6, tp=3475.0)]
+        mt5 = FakeMT5(bid=3472.0, ask=3472.5)
+
+        actions = ManageTP2HitMonitor().evaluate(positions, orders, {"mt5": mt5, "env": {}})
+
+        assert actions == []
+
+    def test_no_tp2_candidates_skips_tick_fetch(self):
+        positions = [_row(1, 1, tp=3460.0), _row(3, 3, tp=3480.0)]
+        mt5 = FakeMT5(bid=3500.0, ask=3500.5)
+
+        actions = ManageTP2HitMonitor().evaluate(positions, [], {"mt5": mt5, "env": {}})
+
+        assert actions == []
+        assert mt5.tick_calls == 0
+
+
+class TestManagePriceLayersMonitor:
+
+    def test_lower_layer_tp_tightened_when_higher_layer_active(self):
+        positions = [
+            _row(1, 1, tp=3480.0, price_open=3468.0),
+            _row(5, 5, tp=3480.0, price_open=3467.0),
+        ]
+        mt5 = FakeMT5(bid=3466.0, ask=3466.5)
+
+        actions = ManagePriceLayersMonitor().evaluate(positions, [], {"mt5": mt5, "env": {}})
+
+        assert [(a.ticket, a.tp) for a in actions if isinstance(a, ModifySLTP)] == [(1, 3468.1)]